@@ -1,60 +1,148 @@
+import asyncio
+import json
+import logging
 import os
-
-
-def _arabic_interval(tf) -> str:
-    s = str(tf).strip().upper()
-    if s.endswith("S"):
-        n = s[:-1] or "0"
-        n_int = int(float(n))
-        unit = "ثانية" if n_int == 1 else "ثوان"
-        return f"{n_int} {unit}"
-    if s.endswith("H"):
-        n = s[:-1] or "0"
-        n_int = int(float(n))
-        unit = "ساعة" if n_int == 1 else "ساعات"
-        return f"{n_int} {unit}"
-    # افتراضي دقائق
-    try:
-        n_int = int(float(s))
-        unit = "دقيقة" if n_int == 1 else "دقائق"
-        return f"{n_int} {unit}"
-    except:
-        return s or "-"
-
+from time import perf_counter
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import httpx
 
+from batch import BodyTooLarge, iter_items
+from coalesce import Coalescer
+from dedup import fingerprint
+from delivery import Delivery, Job, RateLimiter
+from journal import Journal
+from metrics import (
+    IN_FLIGHT, REQUEST, STAGE, TG_ERROR, TG_IN_FLIGHT, TG_LATENCY, TG_RETRY_AFTER, TG_STATUS, registry,
+)
+from routing import Destination, Router
+from state import open_state
+from templates import DISCLAIMER, ESCAPERS, TemplateStore
+
+log = logging.getLogger("uvicorn.error")
+
 BOT_TOKEN   = os.getenv("BOT_TOKEN")
 CHAT_ID     = os.getenv("CHAT_ID")
 ALERT_SECRET= os.getenv("ALERT_SECRET")
 
-app = FastAPI()
-client = httpx.AsyncClient(timeout=15.0)
-
-def _fmt_tv_message(payload: dict) -> str:
-    # رسالة افتراضية مبسطة؛ نقدر نرجع تنسيقك العربي لاحقًا بعد ما نثبت الإرسال
-    return payload.get("text") or (
-        f"📊 {payload.get('symbol','?')}\n"
-        f"إشارة : {payload.get('side','?')}\n"
-        f"💵 السعر: {payload.get('price','?')}\n"
-        f"🕒 الإطار الزمني: {payload.get('timeframe','?')}\n"
-        f"⚠️ جميع ما يُطرح لا يُعدّ توصية."
-    )
-
-async def tg_send(text: str, parse_mode: str | None = None):
-    if not BOT_TOKEN or not CHAT_ID:
+# طابور الإرسال
+QUEUE_MAX      = int(os.getenv("QUEUE_MAX", "1000"))
+QUEUE_POLICY   = os.getenv("QUEUE_POLICY", "reject")  # reject | shed_oldest
+SEND_WORKERS   = int(os.getenv("SEND_WORKERS", "4"))
+SEND_ATTEMPTS  = int(os.getenv("SEND_ATTEMPTS", "5"))
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))    # msg/s for the whole bot
+TG_GROUP_RATE  = float(os.getenv("TG_GROUP_RATE", "20"))     # msg/min per group/channel
+TG_GROUP_BURST = float(os.getenv("TG_GROUP_BURST", "3"))
+DRAIN_TIMEOUT  = float(os.getenv("DRAIN_TIMEOUT", "10"))
+
+# سجل دائم للتنبيهات (فارغ = تعطيل)
+JOURNAL_DIR           = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(4 << 20)))
+JOURNAL_KEEP_SEGMENTS = int(os.getenv("JOURNAL_KEEP_SEGMENTS", "2"))
+JOURNAL_COMMIT_MS     = float(os.getenv("JOURNAL_COMMIT_MS", "2"))
+
+# منع التكرار (إعادة المحاولة من TradingView أو إشارة مكررة في نفس الشمعة)
+DEDUP_TTL          = float(os.getenv("DEDUP_TTL", "300"))  # 0 = تعطيل
+DEDUP_MAX_KEYS     = int(os.getenv("DEDUP_MAX_KEYS", "100000"))
+DEDUP_FIELDS       = tuple(f.strip() for f in os.getenv("DEDUP_FIELDS", "symbol,side,timeframe,price,time").split(",") if f.strip())
+DEDUP_PRICE_BUCKET = float(os.getenv("DEDUP_PRICE_BUCKET", "0"))
+DEDUP_FILE         = os.getenv("DEDUP_FILE", "")  # STATE_URL=memory فقط: يحفظ النافذة بين إعادة التشغيل
+
+# حالة مشتركة بين العمال (حدود الإرسال + مفاتيح التكرار): memory | sqlite:///path | redis://...
+STATE_URL = os.getenv("STATE_URL", "sqlite:///state.db")
+
+# دمج التنبيهات المتقاربة في رسالة واحدة (0 = تعطيل)
+COALESCE_MS = float(os.getenv("COALESCE_MS", "0"))
+
+# إدخال دفعات (/webhook/batch): NDJSON أو مصفوفة JSON
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(1 << 20)))
+BATCH_GROUP     = int(os.getenv("BATCH_GROUP", "100"))  # عدد العناصر اللي تُقبل مع بعض
+
+# جدول التوجيه (JSON): رموز/اتجاه/فريم/استراتيجية -> قنوات، بدل CHAT_ID الواحد
+ROUTES_FILE = os.getenv("ROUTES_FILE", "")
+
+# اتصال تيليجرام (TG_API_BASE يسمح بتوجيهه لخادم وهمي في اختبارات الحمل)
+TG_API_BASE       = os.getenv("TG_API_BASE", "https://api.telegram.org").rstrip("/")
+TG_HTTP2          = os.getenv("TG_HTTP2", "1") == "1"
+TG_MAX_CONN       = int(os.getenv("TG_MAX_CONN", "20"))
+TG_KEEPALIVE_CONN = int(os.getenv("TG_KEEPALIVE_CONN", "10"))
+TG_KEEPALIVE_SECS = float(os.getenv("TG_KEEPALIVE_SECS", "60"))
+
+# قوالب الرسائل (JSON: اسم -> قالب، مع "default" و "strategy:<name>")، تتحدث بدون إعادة تشغيل
+TEMPLATES_FILE = os.getenv("TEMPLATES_FILE", "")
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+except ImportError:
+    TG_HTTP2 = False
+
+client = httpx.AsyncClient(
+    timeout=15.0,
+    http2=TG_HTTP2,
+    limits=httpx.Limits(
+        max_connections=TG_MAX_CONN,
+        max_keepalive_connections=TG_KEEPALIVE_CONN,
+        keepalive_expiry=TG_KEEPALIVE_SECS,
+    ),
+)
+
+router = Router.from_file(ROUTES_FILE) if ROUTES_FILE else None
+templates = TemplateStore(TEMPLATES_FILE)
+
+def _check_destinations(dests):
+    # نترجم كل قالب/parse_mode مرة عند التشغيل: قالب خربان يوقف البدء بدل 500 على كل تنبيه
+    for d in dests:
+        names = [d.template] if d.template is not None else list(templates.named)
+        for name in names:
+            try:
+                templates.get(name, d.parse_mode)
+            except ValueError as e:
+                raise ValueError(f"route to chat {d.chat_id}: {e}") from None
+
+_check_destinations(router.destinations if router else [Destination(CHAT_ID or "")])
+
+# نجهز مقابض المقاييس مرة وحدة عشان التسجيل ما يحجز شي في المسار الساخن
+_STAGE_PARSE   = STAGE.labels("parse")
+_STAGE_AUTH    = STAGE.labels("auth")
+_STAGE_ROUTE   = STAGE.labels("route")
+_STAGE_FORMAT  = STAGE.labels("format")
+_STAGE_JOURNAL = STAGE.labels("journal")
+_STAGE_ENQUEUE = STAGE.labels("enqueue")
+_REQ_WEBHOOK   = REQUEST.labels("webhook")
+_REQ_SEND      = REQUEST.labels("send")
+_REQ_BATCH     = REQUEST.labels("batch")
+_INF_WEBHOOK   = IN_FLIGHT.labels("webhook")
+_INF_SEND      = IN_FLIGHT.labels("send")
+_INF_BATCH     = IN_FLIGHT.labels("batch")
+_TG_OK         = TG_LATENCY.labels("ok")
+_TG_FAIL       = TG_LATENCY.labels("error")
+_TG_INF        = TG_IN_FLIGHT.labels(None)
+_TG_RA         = TG_RETRY_AFTER.labels(None)
+
+def _render(dest: Destination, payload: dict) -> str:
+    if payload.get("text"):
+        return payload["text"]
+    return templates.render(payload, dest.template, dest.parse_mode)
+
+async def tg_send(text: str, parse_mode: str | None = None, chat_id: str | None = None):
+    chat_id = chat_id or CHAT_ID
+    if not BOT_TOKEN or not chat_id:
         return False, "BOT_TOKEN/CHAT_ID not set"
     data = {
-        "chat_id": CHAT_ID,
+        "chat_id": chat_id,
         "text": text,
         "disable_web_page_preview": True,
     }
     if parse_mode:
         data["parse_mode"] = parse_mode
+    _TG_INF.inc()
+    t0 = perf_counter()
     try:
-        r = await client.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=data)
+        r = await client.post(f"{TG_API_BASE}/bot{BOT_TOKEN}/sendMessage", data=data)
+        TG_STATUS.labels(r.status_code).inc()
         ok = False
         info = None
         try:
@@ -62,37 +150,323 @@ async def tg_send(text: str, parse_mode: str | None = None):
             ok = bool(info.get("ok"))  # Telegram-style ok
         except Exception:
             info = {"status": r.status_code, "text": r.text}
-        return (True, info) if ok else (False, info)
+        if ok:
+            _TG_OK.observe(perf_counter() - t0)
+            return True, info
+        _TG_FAIL.observe(perf_counter() - t0)
+        TG_ERROR.labels(info.get("error_code") or r.status_code).inc()
+        retry_after = (info.get("parameters") or {}).get("retry_after")
+        if retry_after:
+            _TG_RA.observe(float(retry_after))
+        return False, info
     except Exception as e:
+        _TG_FAIL.observe(perf_counter() - t0)
+        TG_ERROR.labels(type(e).__name__).inc()
         return False, str(e)
+    finally:
+        _TG_INF.dec()
+
+journal = Journal(
+    JOURNAL_DIR,
+    segment_bytes=JOURNAL_SEGMENT_BYTES, keep_segments=JOURNAL_KEEP_SEGMENTS,
+    commit_delay=JOURNAL_COMMIT_MS / 1000,
+) if JOURNAL_DIR else None
+
+state = open_state(STATE_URL, DEDUP_MAX_KEYS)
+dedup = DEDUP_TTL > 0
+
+def _job_done(job: Job):
+    if journal:
+        for rid in job.ids:
+            journal.done(rid)
+
+delivery = Delivery(
+    tg_send,
+    RateLimiter(state, TG_GLOBAL_RATE, TG_GROUP_RATE, TG_GROUP_BURST),
+    workers=SEND_WORKERS, max_depth=QUEUE_MAX, policy=QUEUE_POLICY, max_attempts=SEND_ATTEMPTS,
+    on_done=_job_done,
+)
+
+def _submit_merged(job: Job):
+    # الدفعة المدموجة تمر بنفس سياسة الطابور (رفض أو حذف الأقدم) مثل أي رسالة
+    if not delivery.submit(job):
+        log.warning("queue full, dropped coalesced message for chat %s", job.chat_id)
+        _job_done(job)
+
+coalescer = Coalescer(
+    _submit_merged, COALESCE_MS / 1000, disclaimer=DISCLAIMER, escapers=ESCAPERS,
+) if COALESCE_MS > 0 else None
+
+@asynccontextmanager
+async def lifespan(app):
+    if dedup and DEDUP_FILE:
+        state.load(DEDUP_FILE)
+    if journal:
+        for rid, p in journal.open():
+            delivery.submit(Job(p["chat_id"], p["text"], p.get("parse_mode"), ids=(rid,)), force=True)
+        journal.start()
+    delivery.start()
+    yield
+    if coalescer:
+        coalescer.flush_all()
+    await delivery.stop(DRAIN_TIMEOUT)
+    if journal:
+        await journal.close()
+    if dedup and DEDUP_FILE:
+        state.save(DEDUP_FILE)
+    await state.close()
+    await client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+def _configured() -> bool:
+    return bool(BOT_TOKEN and (CHAT_ID or router))
+
+_NOT_CONFIGURED = {"ok": False, "reason": "telegram_failed", "info": "BOT_TOKEN/CHAT_ID not set"}
+
+async def _accept_many(payloads: list[dict], dedupe: bool = True) -> list[dict]:
+    """Route, dedup, format, journal and queue a group of alerts.
+
+    Returns one result per payload with its HTTP-style "status". Dedup keys and
+    journal appends go out as one batch, so a group costs about as much as one
+    alert in state round trips and fsyncs.
+    """
+    results: list[dict | None] = [None] * len(payloads)
+    t0 = perf_counter()
+    routed = [router.match(p) if router else [Destination(CHAT_ID)] for p in payloads]
+    t1 = perf_counter()
+    _STAGE_ROUTE.observe(t1 - t0)
+    todo = []
+    for i, dests in enumerate(routed):
+        if dests:
+            todo.append(i)
+        else:
+            results[i] = {"status": 200, "ok": True, "routed": 0}
+    keys: dict[int, bytes] = {}
+    if dedup and dedupe and todo:
+        ks = [fingerprint(payloads[i], DEDUP_FIELDS, DEDUP_PRICE_BUCKET) for i in todo]
+        fresh = []
+        for i, k, dup in zip(todo, ks, await state.seen_many(ks, DEDUP_TTL)):
+            if dup:
+                results[i] = {"status": 200, "ok": True, "duplicate": True}
+            else:
+                keys[i] = k
+                fresh.append(i)
+        todo = fresh
+    sent: dict[int, int] = {}
+    try:
+        return await _queue(payloads, routed, todo, results, keys, sent)
+    except Exception:
+        # فشل بعد تسجيل مفاتيح التكرار (قالب، سجل، ...): نمسحها حتى لا تُعتبر إعادة المحاولة مكررة
+        for i, k in keys.items():
+            if not sent.get(i):
+                await state.forget(k)
+        raise
+
+async def _queue(payloads: list[dict], routed: list, todo: list[int], results: list,
+                 keys: dict[int, bytes], sent: dict[int, int]) -> list[dict]:
+    room = delivery.room()
+    accepted, rejected = [], []
+    for i in todo:
+        if room >= len(routed[i]):
+            accepted.append(i)
+            room -= len(routed[i])
+        else:
+            rejected.append(i)
+    if not accepted:
+        return await _reject(results, rejected, keys)
+
+    t0 = perf_counter()
+    jobs = [(i, Job(d.chat_id, _render(d, payloads[i]), d.parse_mode)) for i in accepted for d in routed[i]]
+    t1 = perf_counter()
+    _STAGE_FORMAT.observe(t1 - t0)
+    if journal:
+        ids = await asyncio.gather(*(
+            journal.append({"chat_id": j.chat_id, "text": j.text, "parse_mode": j.parse_mode}) for _, j in jobs
+        ))
+        for (_, j), rid in zip(jobs, ids):
+            j.ids = (rid,)
+        t0, t1 = t1, perf_counter()
+        _STAGE_JOURNAL.observe(t1 - t0)
+    sent.update(dict.fromkeys(accepted, 0))
+    for i, job in jobs:
+        if coalescer:
+            coalescer.add(job)
+        elif not delivery.submit(job):
+            # الطابور امتلأ أثناء انتظار السجل؛ نقفل القيد حتى لا يُعاد إرساله
+            _job_done(job)
+            continue
+        # نوزع على كل القنوات؛ العمال يرسلون بالتوازي على نفس الاتصال
+        sent[i] += 1
+    _STAGE_ENQUEUE.observe(perf_counter() - t1)
+    for i in accepted:
+        if sent[i]:
+            results[i] = {"status": 202, "ok": True, "queued": True, "routed": sent[i]}
+        else:
+            rejected.append(i)
+    return await _reject(results, rejected, keys)
+
+async def _reject(results: list, rejected: list[int], keys: dict[int, bytes]) -> list:
+    for i in rejected:
+        results[i] = {"status": 503, "ok": False, "reason": "queue_full"}
+        if i in keys:
+            await state.forget(keys[i])  # خلّي إعادة المحاولة تمر
+    return results
+
+async def _enqueue(payload: dict, dedupe: bool = True):
+    if not _configured():
+        return JSONResponse(_NOT_CONFIGURED, status_code=502)
+    res = (await _accept_many([payload], dedupe))[0]
+    status = res.pop("status")
+    headers = {"Retry-After": "1"} if status == 503 else None
+    return JSONResponse(res, status_code=status, headers=headers)
+
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    out = {"ok": True, "queue": delivery.depth()}
+    if dedup:
+        out["dedup"] = state.dedup_stats()
+    return out
+
+def _pool_usage():
+    # httpcore ما يعرض هالأرقام رسميًا، فنقرأها بحذر
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    conns = getattr(pool, "connections", None)
+    if conns is None:
+        return None
+    idle = sum(1 for c in conns if c.is_idle())
+    return {("state", "active"): len(conns) - idle, ("state", "idle"): idle}
+
+registry.gauge_fn("tvbridge_http_pool_connections", "Telegram client connections by state.", _pool_usage)
+registry.gauge_fn("tvbridge_queue_depth", "Jobs waiting for a delivery worker.", lambda: delivery.depth())
+registry.gauge_fn("tvbridge_delivery_total", "Delivery queue outcomes.",
+                  lambda: {("outcome", k): v for k, v in delivery.stats.items()}, kind="counter")
+registry.gauge_fn("tvbridge_dedup_total", "Dedup cache lookups.",
+                  lambda: {("result", "hit"): state.hits, ("result", "miss"): state.misses} if dedup else None,
+                  kind="counter")
+registry.gauge_fn("tvbridge_journal_pending", "Journaled alerts not yet marked delivered.",
+                  lambda: journal and journal.pending())
+registry.gauge_fn("tvbridge_coalesce_total", "Alerts in / messages out of the coalescer.",
+                  lambda: coalescer and {("kind", k): v for k, v in coalescer.stats.items()}, kind="counter")
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/send")
 async def send(req: Request):
-    payload = await req.json()
-    text = payload.get("text")
-    if not text:
-        raise HTTPException(status_code=400, detail="missing 'text'")
-    ok, info = await tg_send(text)
-    if not ok:
-        return JSONResponse({"ok": False, "reason": "telegram_failed", "info": info}, status_code=502)
-    return {"ok": True}
+    _INF_SEND.inc()
+    t0 = perf_counter()
+    try:
+        payload = await req.json()
+        _STAGE_PARSE.observe(perf_counter() - t0)
+        if not payload.get("text"):
+            raise HTTPException(status_code=400, detail="missing 'text'")
+        # رسائل يدوية: نفس النص مرتين مقصود، فما نمنع التكرار إلا لو فيه alert_id صريح
+        return await _enqueue(payload, dedupe=payload.get("alert_id") not in (None, ""))
+    finally:
+        _REQ_SEND.observe(perf_counter() - t0)
+        _INF_SEND.dec()
+
+def _valid_secret(*candidates) -> bool:
+    return bool(ALERT_SECRET) and any(c == ALERT_SECRET for c in candidates)
 
 @app.post("/webhook")
 async def webhook(req: Request):
-    payload = await req.json()
-    # قبول السر من الهيدر أو JSON
-    header_secret = req.headers.get("X-Alert-Secret")
-    body_secret   = payload.get("secret")
-    valid = (ALERT_SECRET and header_secret == ALERT_SECRET) or (ALERT_SECRET and body_secret == ALERT_SECRET)
-    if not valid:
-        raise HTTPException(status_code=400, detail="invalid secret")
-
-    text = _fmt_tv_message(payload)
-    ok, info = await tg_send(text)
-    if not ok:
-        return JSONResponse({"ok": False, "reason": "telegram_failed", "info": info}, status_code=502)
-    return {"ok": True}
+    _INF_WEBHOOK.inc()
+    t0 = perf_counter()
+    try:
+        payload = await req.json()
+        t1 = perf_counter()
+        _STAGE_PARSE.observe(t1 - t0)
+        # قبول السر من الهيدر أو JSON
+        header_secret = req.headers.get("X-Alert-Secret")
+        body_secret   = payload.get("secret")
+        valid = _valid_secret(header_secret, body_secret)
+        _STAGE_AUTH.observe(perf_counter() - t1)
+        if not valid:
+            raise HTTPException(status_code=400, detail="invalid secret")
+
+        return await _enqueue(payload)
+    finally:
+        _REQ_WEBHOOK.observe(perf_counter() - t0)
+        _INF_WEBHOOK.dec()
+
+async def _batch_results(req: Request):
+    """Parse the body incrementally and yield one result per item, in order."""
+    group: list[tuple[int, dict, dict | None]] = []  # (i, payload, ready result)
+    i = 0
+
+    async def flush():
+        todo = [(n, p) for n, p, r in group if r is None]
+        done = dict(zip((n for n, _ in todo), await _accept_many([p for _, p in todo]))) if todo else {}
+        out = [{"i": n, **(r or done[n])} for n, _, r in group]
+        group.clear()
+        return out
+
+    try:
+        async for items in iter_items(req.stream(), BATCH_MAX_BYTES):
+            for it in items:
+                if i >= BATCH_MAX_ITEMS:
+                    for r in await flush():
+                        yield r
+                    yield {"i": i, "status": 413, "ok": False, "reason": "batch_too_large",
+                           "info": f"at most {BATCH_MAX_ITEMS} items per batch"}
+                    return
+                if isinstance(it, ValueError):
+                    group.append((i, {}, {"status": 400, "ok": False, "reason": "invalid_json", "info": str(it)}))
+                elif not isinstance(it, dict):
+                    group.append((i, {}, {"status": 400, "ok": False, "reason": "invalid_item"}))
+                else:
+                    group.append((i, it, None))
+                i += 1
+                if len(group) >= BATCH_GROUP:
+                    for r in await flush():
+                        yield r
+            # نرجّع النتائج مع كل دفعة من الشبكة بدل ما ننتظر نهاية الجسم
+            for r in await flush():
+                yield r
+    except BodyTooLarge as e:
+        for r in await flush():
+            yield r
+        yield {"i": i, "status": 413, "ok": False, "reason": "body_too_large", "info": str(e)}
+
+@app.post("/webhook/batch")
+async def webhook_batch(req: Request):
+    """Bulk alerts as NDJSON or a JSON array; one result per item, in order.
+
+    The body is parsed incrementally and results are returned once it has been
+    read in full: as one JSON document, or NDJSON-formatted (one result per
+    line) with ?stream=1 or Accept: application/x-ndjson.
+    """
+    _INF_BATCH.inc()
+    t0 = perf_counter()
+    try:
+        t1 = perf_counter()
+        # السر من الهيدر فقط: الـ query string يطلع في سجلات uvicorn والبروكسي
+        valid = _valid_secret(req.headers.get("X-Alert-Secret"))
+        _STAGE_AUTH.observe(perf_counter() - t1)
+        if not valid:
+            raise HTTPException(status_code=400, detail="invalid secret")
+        if not _configured():
+            return JSONResponse(_NOT_CONFIGURED, status_code=502)
+        if int(req.headers.get("content-length") or 0) > BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"body exceeds {BATCH_MAX_BYTES} bytes")
+
+        # نقرأ الجسم كله قبل الرد: StreamingResponse يستهلك receive() ليكشف الانقطاع ويرمي باقي الجسم
+        results = [r async for r in _batch_results(req)]
+        if req.query_params.get("stream") in ("1", "true") or "application/x-ndjson" in req.headers.get("accept", ""):
+            body = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+            return Response(body, media_type="application/x-ndjson")
+
+        accepted = sum(1 for r in results if r["status"] == 202)
+        return {
+            "ok": all(r["ok"] for r in results),
+            "count": len(results),
+            "accepted": accepted,
+            "results": results,
+        }
+    finally:
+        _REQ_BATCH.observe(perf_counter() - t0)
+        _INF_BATCH.dec()
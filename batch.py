@@ -0,0 +1,144 @@
+"""Incremental parsing of bulk alert bodies (NDJSON or a JSON array).
+
+Items are yielded as soon as they are complete in the request stream, so the
+body is never held in memory as a whole; only the unparsed tail is buffered.
+"""
+import codecs
+import json
+import re
+
+_WS = " \t\r\n"
+_STRUCT = re.compile(r'["\[\]{},]')
+_STR_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')  # string contents up to the closing quote (or buffer end)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class ItemParser:
+    def __init__(self):
+        self._dec = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self.mode = None  # "array" | "ndjson"
+        self.finished = False
+        self._mark = None  # (offset from item start, depth, in string) where the last boundary scan stopped
+
+    def feed(self, chunk: bytes, final: bool = False) -> list:
+        """Return the items completed by `chunk`; parse errors come back as ValueError items."""
+        self._buf += self._utf8.decode(chunk, final)
+        if self.finished:
+            return []
+        if self.mode is None:
+            head = self._buf.lstrip(_WS)
+            if not head:
+                return []
+            self.mode = "array" if head[0] == "[" else "ndjson"
+            if self.mode == "array":
+                self._buf = head[1:]
+        return self._array(final) if self.mode == "array" else self._ndjson(final)
+
+    def _ndjson(self, final: bool) -> list:
+        lines = self._buf.split("\n")
+        self._buf = "" if final else lines.pop()
+        out = []
+        for ln in lines:
+            ln = ln.strip()
+            if not ln:
+                continue
+            try:
+                out.append(json.loads(ln))
+            except ValueError as e:
+                out.append(ValueError(f"invalid JSON: {e}"))
+        if final:
+            self.finished = True
+        return out
+
+    def _item_end(self, buf: str, pos: int) -> int:
+        """Index of the top-level `,` or `]` closing the item at pos, or -1 if not buffered yet."""
+        off, depth, in_str = self._mark or (0, 0, False)
+        off += pos
+        n = len(buf)
+        while True:
+            if in_str:
+                off = _STR_BODY.match(buf, off).end()
+                if off >= n:
+                    break
+                in_str, off = False, off + 1
+            m = _STRUCT.search(buf, off)
+            if m is None:
+                off = n
+                break
+            c, off = m.group(), m.end()
+            if c == '"':
+                in_str = True
+            elif c in "[{":
+                depth += 1
+            elif depth == 0 and c in ",]":
+                return m.start()
+            elif c in "]}":
+                depth = max(0, depth - 1)
+        self._mark = (off - pos, depth, in_str)  # الدفعة الجاية تكمل من هنا بدل ما تعيد المسح
+        return -1
+
+    def _array(self, final: bool) -> list:
+        buf, pos, n, out = self._buf, 0, len(self._buf), []
+        while True:
+            while pos < n and buf[pos] in _WS:
+                pos += 1
+            if pos >= n:
+                break
+            if buf[pos] == "]":
+                self.finished = True
+                pos += 1
+                break
+            if buf[pos] == ",":
+                pos += 1
+                continue
+            stop = -1
+            if self._mark is not None:
+                # the item was incomplete last time: decode it only once it is whole
+                stop = self._item_end(buf, pos)
+                if stop < 0 and not final:
+                    break
+            try:
+                obj, end = self._dec.raw_decode(buf, pos)
+            except ValueError as e:
+                if stop < 0:
+                    stop = self._item_end(buf, pos)
+                if stop < 0:
+                    break  # غالبًا العنصر ما اكتمل بعد؛ ننتظر الدفعة الجاية
+                # عنصر تالف: نبلغ عنه ونكمل من الفاصلة التالية مثل NDJSON
+                out.append(ValueError(f"invalid JSON: {e}"))
+                self._mark = None
+                pos = stop
+                continue
+            if end >= n and not final:
+                break  # a number at the end of the chunk may still continue
+            self._mark = None
+            out.append(obj)
+            pos = end
+        self._buf = buf[pos:]
+        if final and not self.finished:
+            out.append(ValueError("invalid JSON: truncated item" if self._buf.strip(_WS) else "unterminated JSON array"))
+            self.finished = True
+        return out
+
+
+async def iter_items(stream, max_bytes: int):
+    """Yield lists of parsed items from an async byte stream, chunk by chunk."""
+    parser = ItemParser()
+    total = 0
+    async for chunk in stream:
+        total += len(chunk)
+        if total > max_bytes:
+            raise BodyTooLarge(f"body exceeds {max_bytes} bytes")
+        items = parser.feed(chunk)
+        if items:
+            yield items
+        if parser.finished:
+            return
+    items = parser.feed(b"", final=True)
+    if items:
+        yield items
@@ -0,0 +1,243 @@
+"""Load test for the bridge against a local fake Telegram Bot API.
+
+Starts fake_telegram.FakeTelegram in-process, launches `uvicorn app:app` with
+TG_API_BASE pointed at it, then fires realistic TradingView alerts at /webhook
+and/or /send at a fixed arrival rate (open loop: requests go out on schedule
+whether or not earlier ones have finished). Reports throughput, HTTP and
+end-to-end latency percentiles, delivered/dropped counts and bridge RSS, and
+writes everything to a JSON file for comparing versions.
+
+    python bench.py --rate 200 --duration 30 --endpoint mixed --p429 0.01 --out bench-results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from fake_telegram import add_fault_args, from_args
+
+SECRET = "bench-secret"
+SYMBOLS = ("SPX", "SPY", "QQQ", "NASDAQ:AAPL", "NASDAQ:NVDA", "NASDAQ:TSLA", "BINANCE:BTCUSDT", "BINANCE:ETHUSDT")
+BASE_PRICE = {"SPX": 5200, "SPY": 520, "QQQ": 445, "NASDAQ:AAPL": 190, "NASDAQ:NVDA": 880,
+              "NASDAQ:TSLA": 175, "BINANCE:BTCUSDT": 67000, "BINANCE:ETHUSDT": 3400}
+SIDES = ("call", "put", "buy", "sell")
+TIMEFRAMES = ("1", "5", "15", "60", "240", "D")
+STRATEGIES = ("orb", "vwap-reclaim", "ema-cross", "swing")
+
+# القالب الافتراضي + علامة نلتقطها في الخادم الوهمي لحساب زمن الوصول
+BENCH_TEMPLATES = {
+    "default": "📊 {symbol}\nإشارة : {side|side}\n💵 السعر: {price}\n🕒 الإطار الزمني: {timeframe|interval}\n#{alert_id}",
+}
+
+
+def tv_payload(i: int, rng: random.Random) -> dict:
+    sym = rng.choice(SYMBOLS)
+    return {
+        "secret": SECRET,
+        "alert_id": f"bench-{i}",
+        "symbol": sym,
+        "side": rng.choice(SIDES),
+        "price": round(BASE_PRICE[sym] * (1 + rng.uniform(-0.01, 0.01)), 2),
+        "timeframe": rng.choice(TIMEFRAMES),
+        "strategy": rng.choice(STRATEGIES),
+        "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00Z"),
+    }
+
+
+def pct(sorted_vals: list[float], p: float):
+    if not sorted_vals:
+        return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def summary_ms(vals: list[float]) -> dict:
+    s = sorted(vals)
+    out = {f"p{p}": (round(pct(s, p) * 1000, 3) if s else None) for p in (50, 95, 99)}
+    out["max"] = round(s[-1] * 1000, 3) if s else None
+    out["count"] = len(s)
+    return out
+
+
+def rss_kb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for ln in f:
+                if ln.startswith("VmRSS:"):
+                    return int(ln.split()[1])
+    except OSError:
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def run(a) -> dict:
+    fake = from_args(a)
+    tg_port = await fake.start()
+    work = tempfile.mkdtemp(prefix="tvbench-")
+    tpl = os.path.join(work, "templates.json")
+    with open(tpl, "w", encoding="utf-8") as f:
+        json.dump(BENCH_TEMPLATES, f, ensure_ascii=False)
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123:bench",
+        "CHAT_ID": "-1000000000001",
+        "ALERT_SECRET": SECRET,
+        "TG_API_BASE": f"http://127.0.0.1:{tg_port}",
+        "TEMPLATES_FILE": tpl,
+        "JOURNAL_DIR": os.path.join(work, "journal"),
+        # حالة جديدة لكل تشغيل، وإلا تطلع alert_id المكررة bench-N كلها duplicate
+        "STATE_URL": "sqlite:///" + os.path.join(work, "state.db"),
+    }
+    if not a.real_limits:
+        # بدون هذا يصير القياس مجرد قياس لحد ٢٠ رسالة/دقيقة
+        env.update({"TG_GLOBAL_RATE": "1000000", "TG_GROUP_RATE": "60000000", "TG_GROUP_BURST": "1000000"})
+    for kv in a.bridge_env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    rng = random.Random(a.seed)
+    http_lat: list[float] = []
+    sent_at: dict[int, float] = {}
+    status: dict[str, int] = {}
+    rss_peak = 0
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=30.0,
+                                     limits=httpx.Limits(max_connections=a.connections)) as c:
+            for _ in range(100):
+                try:
+                    if (await c.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("bridge did not start")
+            rss_start = rss_kb(proc.pid)
+
+            async def fire(i: int):
+                use_send = a.endpoint == "send" or (a.endpoint == "mixed" and i % 2)
+                t0 = time.perf_counter()
+                try:
+                    if use_send:
+                        r = await c.post("/send", json={"text": f"scanner sweep hit #bench-{i}"})
+                    else:
+                        r = await c.post("/webhook", json=tv_payload(i, rng))
+                    key = str(r.status_code)
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                t1 = time.perf_counter()
+                status[key] = status.get(key, 0) + 1
+                if key == "202":
+                    http_lat.append(t1 - t0)
+                    sent_at[i] = t0
+
+            total = int(a.rate * a.duration)
+            tasks = []
+            start = time.perf_counter()
+            for i in range(total):
+                delay = start + i / a.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(fire(i)))
+                if i % max(1, int(a.rate)) == 0:
+                    rss_peak = max(rss_peak, rss_kb(proc.pid) or 0)
+            await asyncio.gather(*tasks)
+            load_secs = time.perf_counter() - start
+
+            deadline = time.perf_counter() + a.drain
+            while time.perf_counter() < deadline and not all(i in fake.delivered for i in sent_at):
+                rss_peak = max(rss_peak, rss_kb(proc.pid) or 0)
+                await asyncio.sleep(0.1)
+            metrics_text = (await c.get("/metrics")).text if a.keep_metrics else None
+    finally:
+        proc.terminate()
+        try:
+            # نخلي حلقة الأحداث شغالة: الجسر ممكن يرسل للخادم الوهمي وهو يطفي
+            await asyncio.to_thread(proc.wait, a.drain + 15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        await fake.stop()
+
+    e2e = [fake.delivered[i] - t for i, t in sent_at.items() if i in fake.delivered]
+    delivered = sum(1 for i in sent_at if i in fake.delivered)
+    first = min(sent_at.values(), default=0.0)
+    last = max((fake.delivered[i] for i in sent_at if i in fake.delivered), default=first)
+    result = {
+        "version": git_rev(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(a).items() if k not in ("out",)},
+        "requests": {"offered": int(a.rate * a.duration), "by_status": status,
+                     "accepted_per_s": round(len(sent_at) / load_secs, 2) if load_secs else None},
+        "delivery": {
+            "accepted": len(sent_at),
+            "delivered": delivered,
+            "dropped": len(sent_at) - delivered,
+            "delivered_per_s": round(delivered / (last - first), 2) if last > first else None,
+            "telegram_calls": fake.stats,
+        },
+        "latency_ms": {"http": summary_ms(http_lat), "end_to_end": summary_ms(e2e)},
+        "memory_kb": {"rss_start": rss_start, "rss_peak": rss_peak or None},
+    }
+    if metrics_text is not None:
+        result["metrics"] = metrics_text
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rate", type=float, default=100.0, help="alerts per second (fixed arrival rate)")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    ap.add_argument("--endpoint", choices=("webhook", "send", "mixed"), default="webhook")
+    ap.add_argument("--connections", type=int, default=200, help="max client connections to the bridge")
+    ap.add_argument("--drain", type=float, default=30.0, help="seconds to wait for deliveries after load")
+    ap.add_argument("--real-limits", action="store_true", help="keep the bridge's Telegram rate limits")
+    ap.add_argument("--bridge-env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra environment for the bridge (repeatable), e.g. COALESCE_MS=250")
+    ap.add_argument("--keep-metrics", action="store_true", help="store the bridge's /metrics scrape in the result")
+    ap.add_argument("--out", default="bench-results.json")
+    add_fault_args(ap)
+    a = ap.parse_args()
+
+    res = asyncio.run(run(a))
+    with open(a.out, "w", encoding="utf-8") as f:
+        json.dump(res, f, indent=2, ensure_ascii=False)
+    d, lat = res["delivery"], res["latency_ms"]
+    print(f"accepted {d['accepted']}/{res['requests']['offered']} "
+          f"({res['requests']['accepted_per_s']}/s), delivered {d['delivered']}, dropped {d['dropped']}")
+    print(f"http    p50/p95/p99 ms: {lat['http']['p50']} / {lat['http']['p95']} / {lat['http']['p99']}")
+    print(f"end2end p50/p95/p99 ms: {lat['end_to_end']['p50']} / {lat['end_to_end']['p95']} / {lat['end_to_end']['p99']}")
+    print(f"telegram calls: {d['telegram_calls']}  rss peak: {res['memory_kb']['rss_peak']} kB")
+    print(f"wrote {a.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import asyncio
+
+from delivery import Job
+
+TG_MAX_LEN = 4096
+
+
+def tg_len(text: str) -> int:
+    """Message length as Telegram counts it: UTF-16 code units (emoji count as 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class Coalescer:
+    """Per-chat staging area that merges alerts arriving within `window` seconds.
+
+    A batch is flushed when its window closes or when the next alert would push
+    it past Telegram's message limit; alerts are never split across messages.
+    A trailing disclaimer line is stripped from each alert and added once;
+    `escapers` maps parse_mode to the escaping the renderer applied to it.
+    """
+
+    def __init__(self, submit, window: float, limit: int = TG_MAX_LEN,
+                 disclaimer: str | None = None, sep: str = "\n\n", escapers: dict | None = None):
+        self._submit = submit
+        self.window = window
+        self.limit = limit
+        self.disclaimer = disclaimer
+        self.escapers = escapers or {}
+        self.sep = sep
+        self._sep_len = tg_len(sep)
+        self._batches: dict[tuple, list[Job]] = {}
+        self._sizes: dict[tuple, int] = {}
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+        self._has_disclaimer: dict[tuple, bool] = {}
+        self.stats = {"alerts": 0, "messages": 0}
+
+    def _disclaimer(self, parse_mode) -> str | None:
+        if not self.disclaimer:
+            return None
+        return self.escapers.get(parse_mode, str)(self.disclaimer)
+
+    def _strip(self, text: str, d: str | None) -> tuple[str, bool]:
+        if not d or d not in text:
+            return text, False
+        lines = text.split("\n")
+        kept = [ln for ln in lines if ln.strip() != d]
+        return "\n".join(kept).rstrip(), len(kept) != len(lines)
+
+    def _joined(self, key, body: str) -> int:
+        size = self._sizes.get(key)
+        return tg_len(body) if size is None else size + self._sep_len + tg_len(body)
+
+    def add(self, job: Job):
+        self.stats["alerts"] += 1
+        key = (job.chat_id, job.parse_mode)
+        d = self._disclaimer(job.parse_mode)
+        body, disc = self._strip(job.text, d)
+        if key in self._batches:
+            size = self._joined(key, body)
+            if disc or self._has_disclaimer[key]:
+                size += 1 + tg_len(d)
+            if size > self.limit:
+                self.flush(key)
+        job.text = body
+        self._batches.setdefault(key, []).append(job)
+        self._sizes[key] = self._joined(key, body)
+        self._has_disclaimer[key] = self._has_disclaimer.get(key, False) or disc
+        if key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self.flush, key)
+
+    def flush(self, key):
+        t = self._timers.pop(key, None)
+        if t:
+            t.cancel()
+        batch = self._batches.pop(key, None)
+        self._sizes.pop(key, None)
+        disc = self._has_disclaimer.pop(key, False)
+        if not batch:
+            return
+        text = self.sep.join(j.text for j in batch)
+        if disc:
+            text += "\n" + self._disclaimer(key[1])
+        ids = tuple(i for j in batch for i in j.ids)
+        self.stats["messages"] += 1
+        self._submit(Job(key[0], text, key[1], ids=ids))
+
+    def flush_all(self):
+        for key in list(self._batches):
+            self.flush(key)
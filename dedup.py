@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+log = logging.getLogger("uvicorn.error")
+
+DEFAULT_FIELDS = ("symbol", "side", "timeframe", "price", "time")
+
+
+def fingerprint(payload: dict, fields=DEFAULT_FIELDS, price_bucket: float = 0.0) -> bytes:
+    """16-byte key for an alert: its explicit alert_id, else the chosen payload fields."""
+    if payload.get("alert_id") not in (None, ""):
+        raw = f"id={payload['alert_id']}"
+    else:
+        parts = []
+        for f in fields:
+            v = payload.get(f)
+            if f == "price" and price_bucket and v not in (None, ""):
+                try:
+                    v = int(float(v) // price_bucket)  # نفس الشمعة وسعر قريب = نفس الإشارة
+                except (TypeError, ValueError):
+                    pass
+            parts.append(f"{f}={v}")
+        if all(p.endswith("=None") for p in parts):
+            rest = {k: v for k, v in payload.items() if k != "secret"}
+            raw = json.dumps(rest, sort_keys=True, ensure_ascii=False)
+        else:
+            raw = "|".join(parts)
+        if payload.get("text"):
+            raw += "|text=" + str(payload["text"])
+    return hashlib.blake2b(raw.encode(), digest_size=16).digest()
+
+
+class DedupCache:
+    """Bounded LRU+TTL set of recently seen keys.
+
+    Entries are kept in insertion order, and since every key gets the same TTL
+    that is also expiry order, so expiry and capacity eviction both pop from the
+    front in O(1).
+    """
+
+    def __init__(self, ttl: float = 300.0, max_keys: int = 100_000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._keys: OrderedDict[bytes, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _expire(self, now: float):
+        keys = self._keys
+        while keys:
+            k, exp = next(iter(keys.items()))
+            if exp > now:
+                break
+            keys.popitem(last=False)
+
+    def seen(self, key: bytes) -> bool:
+        """Return True if key is a duplicate within the window, otherwise record it."""
+        now = time.time()
+        self._expire(now)
+        if key in self._keys:
+            self.hits += 1
+            return True
+        self.misses += 1
+        self._keys[key] = now + self.ttl
+        if len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+        return False
+
+    def forget(self, key: bytes):
+        self._keys.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._keys)}
+
+    def save(self, path: str):
+        self._expire(time.time())
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump([[k.hex(), exp] for k, exp in self._keys.items()], f)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        try:
+            with open(path) as f:
+                items = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            log.exception("dedup: could not load %s", path)
+            return
+        now = time.time()
+        for k, exp in sorted(items, key=lambda kv: kv[1]):
+            if exp > now:
+                self._keys[bytes.fromhex(k)] = exp
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+
+log = logging.getLogger("uvicorn.error")
+
+
+@dataclass
+class Job:
+    chat_id: str
+    text: str
+    parse_mode: str | None = None
+    attempts: int = 0
+    ids: tuple[int, ...] = ()  # journal record ids (several when alerts were coalesced)
+
+
+class RateLimiter:
+    # حدود تيليجرام: ~30 رسالة/ث للبوت، ~20 رسالة/دقيقة للمجموعة، ~1 رسالة/ث للمحادثة الخاصة
+    def __init__(self, state, global_rate=30.0, group_per_min=20.0, group_burst=3.0, private_rate=1.0):
+        self.state = state  # shared across workers, see state.py
+        self.global_rate = global_rate
+        self.group_per_min = group_per_min
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+
+    def _chat(self, chat_id: str) -> tuple[str, float, float]:
+        if str(chat_id).startswith("-"):
+            return f"rl:chat:{chat_id}", self.group_per_min / 60.0, self.group_burst
+        return f"rl:chat:{chat_id}", self.private_rate, 1.0
+
+    async def acquire(self, chat_id: str):
+        # الحاويتين (المحادثة + العامة) في عملية وحدة ذرية
+        wait = await self.state.reserve([self._chat(chat_id), ("rl:global", self.global_rate, self.global_rate)])
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def block(self, chat_id: str, seconds: float):
+        await self.state.block(self._chat(chat_id)[0], seconds)
+
+
+def _classify(info) -> tuple[str, float]:
+    """Map a failed tg_send() result to ("retry_after"|"transient"|"fatal", delay)."""
+    if not isinstance(info, dict):
+        return "transient", 0.0  # network error / timeout
+    code = info.get("error_code") or info.get("status") or 0
+    if code == 429:
+        params = info.get("parameters") or {}
+        return "retry_after", float(params.get("retry_after") or 1)
+    if code >= 500 or code == 0:
+        return "transient", 0.0
+    return "fatal", 0.0
+
+
+class Delivery:
+    """Bounded in-process queue drained by worker tasks through the rate limiter."""
+
+    def __init__(self, send, limiter: RateLimiter, *, workers=4, max_depth=1000,
+                 policy="reject", max_attempts=5, backoff=0.5, backoff_max=30.0, on_done=None):
+        if policy not in ("reject", "shed_oldest"):
+            raise ValueError(f"unknown queue policy: {policy!r}")
+        self._send = send
+        self.limiter = limiter
+        self.n_workers = workers
+        self.max_depth = max_depth
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.on_done = on_done  # called once per job when it leaves the system (sent, failed or shed)
+        self._q: deque[Job] = deque()
+        self._ready = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._busy = 0
+        self.stats = {"accepted": 0, "rejected": 0, "shed": 0, "delivered": 0, "failed": 0, "retries": 0}
+
+    def depth(self) -> int:
+        return len(self._q)
+
+    def _finish(self, job: Job):
+        if self.on_done:
+            self.on_done(job)
+
+    def room(self) -> float:
+        """Jobs that can still be accepted before submit() would reject (inf when shedding)."""
+        if self.policy != "reject":
+            return float("inf")
+        return self.max_depth - len(self._q)
+
+    def submit(self, job: Job, force: bool = False) -> bool:
+        if len(self._q) >= self.max_depth and not force:
+            if self.policy == "reject":
+                self.stats["rejected"] += 1
+                return False
+            old = self._q.popleft()
+            self.stats["shed"] += 1
+            log.warning("queue full, shed oldest alert for chat %s", old.chat_id)
+            self._finish(old)
+        self._q.append(job)
+        self.stats["accepted"] += 1
+        self._ready.set()
+        return True
+
+    def start(self):
+        for _ in range(self.n_workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while (self._q or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._q:
+            log.warning("delivery stopped with %d alerts still queued", len(self._q))
+
+    async def _next(self) -> Job:
+        while not self._q:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._q.popleft()
+
+    async def _worker(self):
+        while True:
+            job = await self._next()
+            self._busy += 1
+            try:
+                await self._deliver(job)
+            except asyncio.CancelledError:
+                self._q.appendleft(job)
+                raise
+            except Exception:
+                log.exception("delivery worker error")
+                self.stats["failed"] += 1
+                self._finish(job)
+            finally:
+                self._busy -= 1
+
+    async def _pause(self, n: int):
+        delay = min(self.backoff_max, self.backoff * 2 ** (n - 1))
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def _acquire(self, job: Job):
+        # عطل في مخزن الحالة (قفل SQLite، انقطاع Redis) مؤقت: ننتظر ونعيد بدل ما نضيّع التنبيه
+        n = 0
+        while True:
+            try:
+                return await self.limiter.acquire(job.chat_id)
+            except Exception as e:
+                n += 1
+                log.warning("rate limiter unavailable (%s), retrying", e)
+                await self._pause(n)
+
+    async def _deliver(self, job: Job):
+        while True:
+            await self._acquire(job)
+            job.attempts += 1
+            ok, info = await self._send(job.text, job.parse_mode, job.chat_id)
+            if ok:
+                self.stats["delivered"] += 1
+                self._finish(job)
+                return
+            kind, delay = _classify(info)
+            if kind == "fatal" or job.attempts >= self.max_attempts:
+                self.stats["failed"] += 1
+                log.warning("telegram delivery failed after %d attempts: %s", job.attempts, info)
+                self._finish(job)
+                return
+            self.stats["retries"] += 1
+            if kind == "retry_after":
+                # ننتظر المدة اللي طلبها تيليجرام بالضبط، ونوقف باقي العمال لنفس المحادثة
+                try:
+                    await self.limiter.block(job.chat_id, delay)
+                except Exception as e:
+                    log.warning("rate limiter unavailable (%s), sleeping retry_after locally", e)
+                    await asyncio.sleep(delay)
+            else:
+                await self._pause(job.attempts)
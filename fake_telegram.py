@@ -0,0 +1,153 @@
+"""Local stand-in for the Telegram Bot API sendMessage endpoint.
+
+Serves plain HTTP/1.1 with keep-alive on a raw asyncio server so it can inject
+faults a framework would hide: lognormal response latency, 429s carrying
+parameters.retry_after, 5xx errors and connection resets.
+
+    python fake_telegram.py --port 8081 --latency-ms 80 --p429 0.02 --p5xx 0.01
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from urllib.parse import parse_qs
+
+MARKER = re.compile(r"#bench-(\d+)")
+
+
+class FakeTelegram:
+    def __init__(self, latency_ms=50.0, sigma=0.5, p429=0.0, retry_after=1, p5xx=0.0, preset=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.sigma = sigma  # lognormal shape; 0 = fixed latency
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.p5xx = p5xx
+        self.preset = preset
+        self.rng = random.Random(seed)
+        self.delivered: dict[int, float] = {}  # bench marker -> first accepted time
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "5xx": 0, "reset": 0, "messages": 0}
+        self._server = None
+        self._msg_id = 0
+
+    async def start(self, host="127.0.0.1", port=0) -> int:
+        self._server = await asyncio.start_server(self._conn, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _latency(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.latency_ms / 1000
+        # median = latency_ms
+        return self.rng.lognormvariate(math.log(self.latency_ms / 1000), self.sigma)
+
+    async def _conn(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for ln in lines[1:]:
+                    if ":" in ln:
+                        k, v = ln.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                status, reply = await self._handle(method, path, headers, body)
+                if status is None:
+                    writer.transport.abort()
+                    return
+                data = json.dumps(reply).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, method, path, headers, body):
+        self.stats["requests"] += 1
+        if method != "POST" or not path.endswith("/sendMessage"):
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        r = self.rng.random()
+        if r < self.preset:
+            self.stats["reset"] += 1
+            return None, None
+        await asyncio.sleep(self._latency())
+        r -= self.preset
+        if r < self.p429:
+            self.stats["429"] += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        r -= self.p429
+        if r < self.p5xx:
+            self.stats["5xx"] += 1
+            return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+        if "json" in headers.get("content-type", ""):
+            form = json.loads(body or b"{}")
+        else:
+            form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        text = form.get("text", "")
+        now = time.perf_counter()
+        for m in MARKER.finditer(text):
+            self.delivered.setdefault(int(m.group(1)), now)
+        self.stats["ok"] += 1
+        self.stats["messages"] += 1
+        self._msg_id += 1
+        return 200, {"ok": True, "result": {
+            "message_id": self._msg_id, "date": int(time.time()),
+            "chat": {"id": form.get("chat_id")}, "text": text,
+        }}
+
+
+def add_fault_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="median Telegram response time")
+    ap.add_argument("--sigma", type=float, default=0.5, help="lognormal latency spread (0 = fixed)")
+    ap.add_argument("--p429", type=float, default=0.0, help="probability of a 429 response")
+    ap.add_argument("--retry-after", type=int, default=1, help="retry_after sent with 429s")
+    ap.add_argument("--p5xx", type=float, default=0.0, help="probability of a 502 response")
+    ap.add_argument("--preset", type=float, default=0.0, help="probability of resetting the connection")
+    ap.add_argument("--seed", type=int, default=None)
+
+
+def from_args(a) -> FakeTelegram:
+    return FakeTelegram(a.latency_ms, a.sigma, a.p429, a.retry_after, a.p5xx, a.preset, a.seed)
+
+
+async def _main(a):
+    fake = from_args(a)
+    port = await fake.start(a.host, a.port)
+    print(f"fake Telegram Bot API on http://{a.host}:{port}  (TG_API_BASE=http://{a.host}:{port})")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(fake.stats)
+    finally:
+        await fake.stop()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    add_fault_args(ap)
+    try:
+        asyncio.run(_main(ap.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # ويندوز: عامل واحد فقط
+    fcntl = None
+
+log = logging.getLogger("uvicorn.error")
+
+# سجل كل رسالة: len(payload) | crc32(type+id+payload) | type | id | payload
+HDR = struct.Struct("<IIBQ")
+ALERT = 1
+DONE = 2
+
+
+def _encode(typ: int, rid: int, payload: bytes = b"") -> bytes:
+    tail = struct.pack("<BQ", typ, rid) + payload
+    return struct.pack("<II", len(payload), zlib.crc32(tail)) + tail
+
+
+def _scan(buf):
+    """Yield (type, id, payload) until the end or the first torn/corrupt record."""
+    off, n = 0, len(buf)
+    while off + HDR.size <= n:
+        ln, crc, typ, rid = HDR.unpack_from(buf, off)
+        end = off + HDR.size + ln
+        if end > n or zlib.crc32(buf[off + 8:end]) != crc:
+            break
+        yield typ, rid, buf[off + HDR.size:end]
+        off = end
+
+
+class Journal:
+    """Segmented append-only write-ahead log for accepted alerts.
+
+    Appends are group-committed: every caller waiting in the same flush window
+    shares one write+fsync. Delivered alerts get a DONE record; on startup any
+    ALERT without a DONE is handed back for re-delivery. Sealed segments are
+    retired oldest-first, carrying any still-pending alerts forward.
+
+    With several uvicorn workers each process locks its own slot directory
+    (base/0, base/1, ...), so segments are never shared; a restarted worker
+    picks up whichever slot is free, including ones left by a crashed worker.
+    """
+
+    def __init__(self, path: str, *, segment_bytes=4 << 20, keep_segments=2, commit_delay=0.002, slots=64):
+        self.base = path
+        self.path = path
+        self.slots = slots
+        self._lock_fd = None
+        self.segment_bytes = segment_bytes
+        self.keep_segments = keep_segments
+        self.commit_delay = commit_delay
+        self._segs: list[int] = []           # segment numbers, oldest first; last is active
+        self._seg_ids: dict[int, set[int]] = {}
+        self._where: dict[int, int] = {}      # pending alert id -> segment
+        self._payload: dict[int, bytes] = {}  # pending alert id -> encoded payload
+        self._buf: list[bytes] = []
+        self._buf_ids: list[int] = []         # ALERT ids in _buf, dropped if their write fails
+        self._waiters: list[asyncio.Future] = []
+        self._wake = asyncio.Event()
+        self._fh = None
+        self._size = 0
+        self._next_id = 1
+        self._task = None
+
+    def _seg_path(self, n: int) -> str:
+        return os.path.join(self.path, f"{n:08d}.wal")
+
+    def open(self) -> list[tuple[int, dict]]:
+        """Replay existing segments and return the undelivered alerts as (id, payload)."""
+        self._claim_slot()
+        segs = sorted(int(f[:-4]) for f in os.listdir(self.path) if f.endswith(".wal"))
+        done: set[int] = set()
+        for n in segs:
+            self._seg_ids[n] = set()
+            with open(self._seg_path(n), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    for typ, rid, payload in _scan(m):
+                        self._next_id = max(self._next_id, rid + 1)
+                        if typ == ALERT:
+                            # نسخة أحدث (بعد الضغط) تحل محل القديمة
+                            old = self._where.get(rid)
+                            if old is not None:
+                                self._seg_ids[old].discard(rid)
+                            self._where[rid] = n
+                            self._seg_ids[n].add(rid)
+                            self._payload[rid] = payload
+                        elif typ == DONE:
+                            done.add(rid)
+        for rid in done:
+            self._forget(rid)
+        self._segs = segs
+        self._roll()
+        pending = sorted(self._where)
+        if pending:
+            log.warning("journal: replaying %d undelivered alerts", len(pending))
+        return [(rid, json.loads(self._payload[rid])) for rid in pending]
+
+    def _claim_slot(self):
+        for i in range(self.slots if fcntl else 1):
+            path = os.path.join(self.base, str(i))
+            os.makedirs(path, exist_ok=True)
+            fd = os.open(os.path.join(path, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)
+                    continue
+            self.path, self._lock_fd = path, fd
+            return
+        raise RuntimeError(f"journal: all {self.slots} slots under {self.base} are locked")
+
+    def pending(self) -> int:
+        return len(self._where)
+
+    def start(self):
+        self._task = asyncio.create_task(self._flusher())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._buf:
+            self._write(b"".join(self._buf))
+            self._buf.clear()
+            self._buf_ids.clear()
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # يفك القفل
+            self._lock_fd = None
+
+    async def append(self, payload: dict) -> int:
+        """Durably record an alert; returns its id once the batch holding it is fsynced."""
+        rid = self._next_id
+        self._next_id += 1
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        seg = self._segs[-1]
+        self._where[rid] = seg
+        self._seg_ids[seg].add(rid)
+        self._payload[rid] = body
+        self._buf.append(_encode(ALERT, rid, body))
+        self._buf_ids.append(rid)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._wake.set()
+        await fut
+        return rid
+
+    def done(self, rid: int):
+        # ما نستنى fsync هنا: أسوأ الأحوال إعادة إرسال بعد انهيار
+        if rid in self._where:
+            self._forget(rid)
+            self._buf.append(_encode(DONE, rid))
+
+    def _forget(self, rid: int):
+        seg = self._where.pop(rid, None)
+        if seg is not None:
+            self._seg_ids[seg].discard(rid)
+        self._payload.pop(rid, None)
+
+    def _roll(self):
+        if self._fh:
+            self._fh.close()
+        n = (self._segs[-1] + 1) if self._segs else 1
+        self._segs.append(n)
+        self._seg_ids[n] = set()
+        self._fh = open(self._seg_path(n), "ab", buffering=0)
+        self._size = 0
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.path, os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _write(self, data: bytes):
+        if data:
+            self._fh.write(data)
+            os.fsync(self._fh.fileno())
+            self._size += len(data)
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._waiters and self.commit_delay:
+                await asyncio.sleep(self.commit_delay)  # let concurrent appends join this group
+            batch, self._buf = self._buf, []
+            rids, self._buf_ids = self._buf_ids, []
+            waiters, self._waiters = self._waiters, []
+            try:
+                await asyncio.to_thread(self._write, b"".join(batch))
+            except Exception as e:
+                log.exception("journal write failed")
+                # أصحابها استلموا خطأ؛ لو بقيت هنا كان الضغط بيكتبها وتنعاد بعد التشغيل
+                for rid in rids:
+                    self._forget(rid)
+                for f in waiters:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+            for f in waiters:
+                if not f.done():
+                    f.set_result(None)
+            try:
+                if self._size >= self.segment_bytes:
+                    self._roll()
+                await self._compact()
+            except Exception:
+                log.exception("journal rotation/compaction failed")
+
+    async def _compact(self):
+        # نحذف الأقدم أولاً فقط، حتى لا يضيع سجل DONE يخص قطعة أقدم
+        while len(self._segs) > 1:
+            oldest = self._segs[0]
+            live = self._seg_ids[oldest]
+            if live:
+                if len(self._segs) - 1 <= self.keep_segments:
+                    return
+                active = self._segs[-1]
+                out = []
+                for rid in live:
+                    out.append(_encode(ALERT, rid, self._payload[rid]))
+                    self._where[rid] = active
+                    self._seg_ids[active].add(rid)
+                live.clear()
+                await asyncio.to_thread(self._write, b"".join(out))
+            os.unlink(self._seg_path(oldest))
+            self._segs.pop(0)
+            del self._seg_ids[oldest]
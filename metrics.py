@@ -0,0 +1,143 @@
+from bisect import bisect_left
+
+# حدود ثابتة بالثواني: من ٥٠ ميكروثانية لحد ٣٠ ثانية
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is a bisect plus two adds: no locks,
+    no per-call allocation beyond the float sum. Safe because everything runs
+    on the one event-loop thread."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot = +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+
+
+class Family:
+    """A metric name with one label; children are created once and reused."""
+
+    def __init__(self, kind: str, name: str, help: str, label: str | None = None, factory=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label = label
+        self.factory = factory
+        self.children: dict = {}
+
+    def labels(self, value):
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = self.factory()
+        return child
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def dec(self, n=1):
+        self.value -= n
+
+
+def _fmt(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._families: list[Family] = []
+        self._callbacks: list[tuple[str, str, str, object]] = []
+
+    def _add(self, fam: Family) -> Family:
+        self._families.append(fam)
+        return fam
+
+    def histogram(self, name, help, label=None, bounds=LATENCY_BUCKETS):
+        return self._add(Family("histogram", name, help, label, lambda: Histogram(bounds)))
+
+    def counter(self, name, help, label=None):
+        return self._add(Family("counter", name, help, label, Counter))
+
+    def gauge(self, name, help, label=None):
+        return self._add(Family("gauge", name, help, label, Gauge))
+
+    def gauge_fn(self, name, help, fn, kind="gauge"):
+        """Value(s) read only at scrape time; fn returns a number or {label_value: number}."""
+        self._callbacks.append((name, help, kind, fn))
+
+    def render(self) -> str:
+        out: list[str] = []
+        for f in self._families:
+            out.append(f"# HELP {f.name} {f.help}")
+            out.append(f"# TYPE {f.name} {f.kind}")
+            for lv, child in list(f.children.items()):
+                lbl = f'{f.label}="{_esc(lv)}"' if f.label else ""
+                if f.kind == "histogram":
+                    acc = 0
+                    for b, c in zip(child.bounds + (float("inf"),), child.counts):
+                        acc += c
+                        le = "+Inf" if b == float("inf") else repr(b)
+                        sep = "," if lbl else ""
+                        out.append(f'{f.name}_bucket{{{lbl}{sep}le="{le}"}} {acc}')
+                    braces = f"{{{lbl}}}" if lbl else ""
+                    out.append(f"{f.name}_sum{braces} {child.sum!r}")
+                    out.append(f"{f.name}_count{braces} {acc}")
+                else:
+                    braces = f"{{{lbl}}}" if lbl else ""
+                    out.append(f"{f.name}{braces} {_fmt(child.value)}")
+        for name, help, kind, fn in self._callbacks:
+            try:
+                v = fn()
+            except Exception:
+                continue
+            if v is None:
+                continue
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            if isinstance(v, dict):
+                for k, x in v.items():
+                    label, lv = k if isinstance(k, tuple) else ("key", k)
+                    out.append(f'{name}{{{label}="{_esc(lv)}"}} {_fmt(x)}')
+            else:
+                out.append(f"{name} {_fmt(v)}")
+        out.append("")
+        return "\n".join(out)
+
+
+registry = Registry()
+
+STAGE = registry.histogram("tvbridge_stage_seconds", "Time spent per request/delivery stage.", "stage")
+REQUEST = registry.histogram("tvbridge_request_seconds", "End-to-end handler latency.", "endpoint")
+IN_FLIGHT = registry.gauge("tvbridge_requests_in_flight", "Requests currently being handled.", "endpoint")
+TG_LATENCY = registry.histogram("tvbridge_telegram_seconds", "Telegram sendMessage round trip.", "outcome")
+TG_STATUS = registry.counter("tvbridge_telegram_responses_total", "Telegram responses by HTTP status.", "status")
+TG_ERROR = registry.counter("tvbridge_telegram_errors_total", "Telegram error_code values and transport errors.", "error")
+TG_RETRY_AFTER = registry.histogram(
+    "tvbridge_telegram_retry_after_seconds", "retry_after values returned with 429s.",
+    bounds=(1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+TG_IN_FLIGHT = registry.gauge("tvbridge_telegram_in_flight", "sendMessage calls awaiting a response.")
@@ -0,0 +1,128 @@
+import json
+import re
+from dataclasses import dataclass
+from fnmatch import translate
+
+GLOB_CHARS = set("*?[")
+
+
+@dataclass(frozen=True)
+class Destination:
+    chat_id: str
+    template: str | None = None
+    parse_mode: str | None = None
+
+
+@dataclass
+class Rule:
+    order: int
+    destinations: tuple[Destination, ...]
+    sides: frozenset | None = None
+    timeframes: frozenset | None = None
+    strategies: frozenset | None = None
+    glob: re.Pattern | None = None  # only for symbol patterns the index can't answer
+
+    def accepts(self, payload: dict) -> bool:
+        if self.sides is not None and str(payload.get("side", "")).strip().lower() not in self.sides:
+            return False
+        if self.timeframes is not None and str(payload.get("timeframe", "")).strip().upper() not in self.timeframes:
+            return False
+        if self.strategies is not None and str(payload.get("strategy", "")).strip() not in self.strategies:
+            return False
+        return True
+
+
+def _set(v, norm):
+    if v is None:
+        return None
+    if not isinstance(v, list):
+        v = [v]
+    return frozenset(norm(str(x).strip()) for x in v)
+
+
+def _dest(d, template=None, parse_mode=None) -> Destination:
+    if isinstance(d, dict):
+        return Destination(str(d["chat_id"]), d.get("template", template), d.get("parse_mode", parse_mode))
+    return Destination(str(d), template, parse_mode)
+
+
+class Router:
+    """Routing table compiled into an index.
+
+    Exact symbols go in a dict, "PREFIX*" patterns in a character trie and
+    rules without a symbol in an always-candidate list; only symbol globs the
+    two indexes can't express are matched by regex. Candidates are then checked
+    on side/timeframe/strategy and returned in config order.
+    """
+
+    def __init__(self, routes: list[dict], default: dict | None = None):
+        self.exact: dict[str, list[Rule]] = {}
+        self.trie: dict = {}
+        self.anywhere: list[Rule] = []
+        self.globs: list[Rule] = []
+        self.default = tuple(_dest(c, default.get("template"), default.get("parse_mode"))
+                             for c in default.get("chats", [])) if default else ()
+        self.destinations: set[Destination] = set(self.default)  # every distinct destination, for up-front checks
+        for i, r in enumerate(routes):
+            tpl, pm = r.get("template"), r.get("parse_mode")
+            chats = r.get("chats") or ([r["chat_id"]] if "chat_id" in r else [])
+            if not chats:
+                raise ValueError(f"route #{i} has no chats")
+            rule = Rule(
+                order=i,
+                destinations=tuple(_dest(c, tpl, pm) for c in chats),
+                sides=_set(r.get("side"), str.lower),
+                timeframes=_set(r.get("timeframe"), str.upper),
+                strategies=_set(r.get("strategy"), str),
+            )
+            self.destinations.update(rule.destinations)
+            symbols = r.get("symbol", "*")
+            for sym in (symbols if isinstance(symbols, list) else [symbols]):
+                self._index(str(sym).strip().upper(), rule)
+
+    def _index(self, sym: str, rule: Rule):
+        if not GLOB_CHARS & set(sym):
+            self.exact.setdefault(sym, []).append(rule)
+        elif sym == "*":
+            self.anywhere.append(rule)
+        elif sym.endswith("*") and not GLOB_CHARS & set(sym[:-1]):
+            node = self.trie
+            for ch in sym[:-1]:
+                node = node.setdefault(ch, {})
+            node.setdefault("", []).append(rule)
+        else:
+            # نسخة لكل نمط حتى لا يختلط regex بين رموز نفس القاعدة
+            self.globs.append(Rule(rule.order, rule.destinations, rule.sides, rule.timeframes,
+                                   rule.strategies, re.compile(translate(sym))))
+
+    @classmethod
+    def from_file(cls, path: str) -> "Router":
+        with open(path, encoding="utf-8") as f:
+            cfg = json.load(f)
+        return cls(cfg.get("routes", []), cfg.get("default"))
+
+    def _candidates(self, sym: str) -> list[Rule]:
+        out = list(self.anywhere)
+        out += self.exact.get(sym, ())
+        node = self.trie
+        out += node.get("", ())
+        for ch in sym:
+            node = node.get(ch)
+            if node is None:
+                break
+            out += node.get("", ())
+        out += [r for r in self.globs if r.glob.match(sym)]
+        return out
+
+    def match(self, payload: dict) -> list[Destination]:
+        sym = str(payload.get("symbol", "")).strip().upper()
+        seen: set[str] = set()
+        dests: list[Destination] = []
+        for rule in sorted(self._candidates(sym), key=lambda r: r.order):
+            if not rule.accepts(payload):
+                continue
+            for d in rule.destinations:
+                if d.chat_id not in seen:
+                    seen.add(d.chat_id)
+                    dests.append(d)
+        return dests or list(self.default)
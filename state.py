@@ -0,0 +1,297 @@
+"""Shared state for rate limits and dedup keys.
+
+Every uvicorn worker (or instance) has to see the same token buckets and the
+same dedup window, otherwise limits are off by a factor of N. Backends:
+
+    memory                    per-process only (tests, single worker)
+    sqlite:///path/state.db   default; WAL-mode file shared by all local workers
+    redis://host:6379/0       needs the `redis` package; shared across instances
+
+Each call is one atomic round trip: reserve() takes a token from the chat and
+the global bucket in a single transaction / Lua script, seen_many() checks and
+records a whole batch of keys at once. A backend error (SQLite busy, Redis
+down) propagates to the caller; delivery treats it as transient and retries.
+"""
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from dedup import DedupCache
+
+
+def _take(tokens, stamp, blocked, rate, burst, now):
+    tokens = min(burst, tokens + max(0.0, now - stamp) * rate) - 1
+    wait = -tokens / rate if tokens < 0 else 0.0
+    return tokens, max(wait, blocked - now)
+
+
+class State(abc.ABC):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, dup: list[bool]) -> list[bool]:
+        n = sum(dup)
+        self.hits += n
+        self.misses += len(dup) - n
+        return dup
+
+    @abc.abstractmethod
+    async def reserve(self, buckets: list[tuple[str, float, float]]) -> float:
+        """Take one token from each (key, rate/s, burst) bucket; return seconds to wait."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def block(self, key: str, seconds: float):
+        raise NotImplementedError
+
+    async def seen(self, key: bytes, ttl: float) -> bool:
+        return (await self.seen_many([key], ttl))[0]
+
+    @abc.abstractmethod
+    async def seen_many(self, keys: list[bytes], ttl: float) -> list[bool]:
+        """For each key: True if already recorded within ttl, else record it."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def forget(self, key: bytes):
+        raise NotImplementedError
+
+    def dedup_stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def load(self, path: str):
+        pass
+
+    def save(self, path: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryState(State):
+    def __init__(self, max_keys: int = 100_000):
+        super().__init__()
+        self.buckets: dict[str, list[float]] = {}
+        self.dedup = DedupCache(max_keys=max_keys)
+
+    async def reserve(self, buckets):
+        now = time.time()
+        wait = 0.0
+        for key, rate, burst in buckets:
+            b = self.buckets.get(key)
+            if b is None:
+                b = self.buckets[key] = [burst, now, 0.0]
+            b[0], w = _take(b[0], b[1], b[2], rate, burst, now)
+            b[1] = now
+            wait = max(wait, w)
+        return wait
+
+    async def block(self, key, seconds):
+        b = self.buckets.get(key)
+        until = time.time() + seconds
+        if b is None:
+            self.buckets[key] = [float("inf"), time.time(), until]  # inf = full bucket once refilled
+        else:
+            b[2] = max(b[2], until)
+
+    async def seen_many(self, keys, ttl):
+        self.dedup.ttl = ttl
+        return self._count([self.dedup.seen(k) for k in keys])
+
+    async def forget(self, key):
+        self.dedup.forget(key)
+
+    def dedup_stats(self):
+        return {**super().dedup_stats(), "size": len(self.dedup)}
+
+    def load(self, path):
+        self.dedup.load(path)
+
+    def save(self, path):
+        self.dedup.save(path)
+
+
+class SQLiteState(State):
+    """WAL-mode SQLite file shared by the local workers.
+
+    The connection is used from worker threads (one at a time, behind a lock)
+    so a writer holding the file lock never stalls the event loop; a query
+    still waiting after `timeout` raises sqlite3.OperationalError.
+    """
+
+    # استعلامات قصيرة على ملف محلي في وضع WAL: عشرات الميكروثواني، أقل بكثير من رحلة لتيليجرام
+    def __init__(self, path: str, max_keys: int = 100_000, purge_every: int = 1000, timeout: float = 2.0):
+        super().__init__()
+        self.max_keys = max_keys
+        self.purge_every = purge_every
+        self._ops = 0
+        self._lock = threading.Lock()
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=timeout)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, stamp REAL, blocked REAL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS dedup (key BLOB PRIMARY KEY, exp REAL) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS dedup_exp ON dedup (exp);
+        """)
+        self._size = self.db.execute("SELECT count(*) FROM dedup").fetchone()[0]
+
+    def _txn(self, fn):
+        with self._lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return out
+
+    async def _run(self, fn):
+        return await asyncio.to_thread(self._txn, fn)
+
+    async def reserve(self, buckets):
+        now = time.time()
+
+        def run(db):
+            wait = 0.0
+            for key, rate, burst in buckets:
+                row = db.execute("SELECT tokens, stamp, blocked FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, w = _take(*(row or (burst, now, 0.0)), rate, burst, now)
+                db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+                           (key, tokens, now, row[2] if row else 0.0))
+                wait = max(wait, w)
+            return wait
+        return await self._run(run)
+
+    async def block(self, key, seconds):
+        now = time.time()
+        await self._run(lambda db: db.execute(
+            "INSERT INTO buckets VALUES (?, 1e18, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET blocked = max(blocked, excluded.blocked)",
+            (key, now, now + seconds),
+        ))
+
+    async def seen_many(self, keys, ttl):
+        now = time.time()
+        purge = self._ops + len(keys) >= self.purge_every
+        self._ops = 0 if purge else self._ops + len(keys)
+
+        def run(db):
+            out = []
+            for k in keys:
+                cur = db.execute(
+                    "INSERT INTO dedup VALUES (?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET exp = excluded.exp WHERE dedup.exp <= ?",
+                    (k, now + ttl, now),
+                )
+                out.append(cur.rowcount == 0)
+            if purge:
+                self._purge(db, now)
+            return out
+        return self._count(await self._run(run))
+
+    def _purge(self, db, now):
+        db.execute("DELETE FROM dedup WHERE exp <= ?", (now,))
+        size = db.execute("SELECT count(*) FROM dedup").fetchone()[0]
+        if size > self.max_keys:
+            db.execute("DELETE FROM dedup WHERE key IN (SELECT key FROM dedup ORDER BY exp LIMIT ?)",
+                       (size - self.max_keys,))
+            size = self.max_keys
+        self._size = size
+
+    async def forget(self, key):
+        await self._run(lambda db: db.execute("DELETE FROM dedup WHERE key = ?", (key,)))
+
+    def dedup_stats(self):
+        # العدد من آخر تنظيف؛ /health ما يستاهل ينتظر قفل الملف
+        return {**super().dedup_stats(), "size": self._size}
+
+    async def close(self):
+        with self._lock:
+            self.db.close()
+
+
+_RESERVE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+for i, k in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i - 1])
+  local burst = tonumber(ARGV[2 * i])
+  local v = redis.call('HMGET', k, 'tokens', 'stamp', 'blocked')
+  local tokens = tonumber(v[1]) or burst
+  local stamp = tonumber(v[2]) or now
+  local blocked = tonumber(v[3]) or 0
+  tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate) - 1
+  local w = 0
+  if tokens < 0 then w = -tokens / rate end
+  if blocked - now > w then w = blocked - now end
+  if w > wait then wait = w end
+  redis.call('HSET', k, 'tokens', tostring(tokens), 'stamp', tostring(now), 'blocked', tostring(blocked))
+  redis.call('EXPIRE', k, 3600)
+end
+return tostring(wait)
+"""
+
+_BLOCK_LUA = """
+local t = redis.call('TIME')
+local until_ = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[1])
+local cur = tonumber(redis.call('HGET', KEYS[1], 'blocked')) or 0
+if until_ > cur then redis.call('HSET', KEYS[1], 'blocked', tostring(until_)) end
+redis.call('EXPIRE', KEYS[1], 3600)
+return 1
+"""
+
+
+class RedisState(State):
+    def __init__(self, url: str, prefix: str = "tvb:"):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("STATE_URL=redis://... needs the 'redis' package (pip install redis)")
+        self.r = redis.from_url(url)
+        self.prefix = prefix
+        self._reserve = self.r.register_script(_RESERVE_LUA)
+        self._block = self.r.register_script(_BLOCK_LUA)
+
+    async def reserve(self, buckets):
+        keys = [self.prefix + k for k, _, _ in buckets]
+        args = [x for _, rate, burst in buckets for x in (rate, burst)]
+        return float(await self._reserve(keys=keys, args=args))
+
+    async def block(self, key, seconds):
+        await self._block(keys=[self.prefix + key], args=[seconds])
+
+    async def seen_many(self, keys, ttl):
+        pipe = self.r.pipeline(transaction=False)
+        for k in keys:
+            pipe.set(self.prefix.encode() + b"d:" + k, b"1", nx=True, px=int(ttl * 1000))
+        return self._count([not ok for ok in await pipe.execute()])
+
+    async def forget(self, key):
+        await self.r.delete(self.prefix.encode() + b"d:" + key)
+
+    async def close(self):
+        await self.r.aclose()
+
+
+def open_state(url: str, max_keys: int = 100_000) -> State:
+    if url in ("", "memory"):
+        return MemoryState(max_keys)
+    if url.startswith("sqlite://"):
+        # sqlite:///relative.db, sqlite:////absolute/path.db
+        return SQLiteState(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url[len("sqlite://"):], max_keys)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    raise ValueError(f"unsupported STATE_URL: {url!r}")
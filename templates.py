@@ -0,0 +1,214 @@
+import html
+import json
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+
+log = logging.getLogger("uvicorn.error")
+
+DISCLAIMER = "⚠️ جميع ما يُطرح لا يُعدّ توصية."
+
+DEFAULT_TEMPLATE = (
+    "📊 {symbol}\n"
+    "إشارة : {side|side}\n"
+    "💵 السعر: {price}\n"
+    "🕒 الإطار الزمني: {timeframe|interval}\n"
+    + DISCLAIMER
+)
+
+# مفرد، مثنى، جمع (٣-١٠)؛ من ١١ وفوق يرجع المفرد
+_UNITS = {
+    "S": ("ثانية", "ثانيتان", "ثوان"),
+    "": ("دقيقة", "دقيقتان", "دقائق"),
+    "H": ("ساعة", "ساعتان", "ساعات"),
+    "D": ("يوم", "يومان", "أيام"),
+    "W": ("أسبوع", "أسبوعان", "أسابيع"),
+    "M": ("شهر", "شهران", "أشهر"),  # TradingView: M = شهر، الدقائق بدون لاحقة
+}
+
+_SIDES = (
+    (("put", "sell", "short"), "PUT 🔴"),
+    (("call", "buy", "long"), "Call 🟢"),
+)
+
+
+@lru_cache(maxsize=256)
+def arabic_interval(tf: str) -> str:
+    s = str(tf).strip()
+    if not s:
+        return "-"
+    # الحالة مهمة للـ M فقط: M شهر و m دقيقة؛ باقي اللواحق بأي حالة
+    suffix = "" if s[-1] == "m" else s[-1].upper()
+    if suffix in _UNITS and s[-1].isalpha():
+        num = s[:-1]
+    else:
+        suffix, num = "", s
+    try:
+        n = int(float(num)) if num else 1
+    except ValueError:
+        return s or "-"
+    one, two, many = _UNITS[suffix]
+    if n == 2:
+        return two
+    return f"{n} {many if 3 <= n <= 10 else one}"
+
+
+@lru_cache(maxsize=256)
+def normalize_side(side: str) -> str:
+    raw = str(side).strip()
+    s = raw.lower()
+    for prefixes, label in _SIDES:
+        if s.startswith(prefixes):
+            return label
+    return raw
+
+
+_MDV2 = str.maketrans({c: "\\" + c for c in "_*[]()~`>#+-=|{}.!\\"})
+_MD = str.maketrans({c: "\\" + c for c in "_*`["})
+
+ESCAPERS = {
+    None: str,
+    "HTML": lambda v: html.escape(v, quote=False),
+    "MarkdownV2": lambda v: v.translate(_MDV2),
+    "Markdown": lambda v: v.translate(_MD),
+}
+
+FILTERS = {
+    "side": normalize_side,
+    "interval": arabic_interval,
+    "upper": str.upper,
+    "lower": str.lower,
+}
+
+_TOKEN = re.compile(r"\{\{|\}\}|\{\s*([A-Za-z_][\w.]*)\s*((?:\|\s*[a-z_]+\s*)*)\}")
+
+
+def _field(key: str, filters: tuple, escape):
+    def render(p: dict) -> str:
+        v = p.get(key)
+        if v is None or v == "":
+            return "?"
+        v = str(v)
+        for f in filters:
+            v = f(v)
+        return escape(v)
+    return render
+
+
+def compile_template(source: str, parse_mode: str | None = None, plain: bool = False):
+    """Parse `source` once into a render(payload) -> str function.
+
+    Placeholders are `{field}` or `{field|filter|...}`; `{{` / `}}` are literal
+    braces. Field values are escaped for parse_mode; the template text itself
+    is taken as markup unless `plain` is set.
+    """
+    try:
+        escape = ESCAPERS[parse_mode]
+    except KeyError:
+        raise ValueError(f"unsupported parse_mode: {parse_mode!r}")
+    ops: list = []
+    lit: list[str] = []
+    pos = 0
+    for m in _TOKEN.finditer(source):
+        lit.append(source[pos:m.start()])
+        pos = m.end()
+        tok = m.group(0)
+        if tok in ("{{", "}}"):
+            lit.append(tok[0])
+            continue
+        names = [n.strip() for n in m.group(2).split("|") if n.strip()]
+        unknown = [n for n in names if n not in FILTERS]
+        if unknown:
+            raise ValueError(f"unknown template filter(s): {', '.join(unknown)}")
+        if lit:
+            ops.append("".join(lit))
+            lit = []
+        ops.append(_field(m.group(1), tuple(FILTERS[n] for n in names), escape))
+    lit.append(source[pos:])
+    if "".join(lit):
+        ops.append("".join(lit))
+    if plain:
+        ops = [escape(o) if o.__class__ is str else o for o in ops]
+    ops = tuple(ops)
+
+    def render(payload: dict) -> str:
+        return "".join([o if o.__class__ is str else o(payload) for o in ops])
+    return render
+
+
+class TemplateStore:
+    """Named templates from an optional JSON file plus a compiled-render cache.
+
+    The file is re-stat'ed at most every `check_every` seconds; when its mtime
+    changes it is reloaded and the cache dropped, so edits apply without a
+    restart. Names that aren't in the file are treated as template text.
+    """
+
+    def __init__(self, path: str = "", check_every: float = 1.0):
+        self.path = path
+        self.check_every = check_every
+        self.named: dict[str, str] = {"default": DEFAULT_TEMPLATE}
+        self._compiled: dict[tuple, object] = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._maybe_reload()
+
+    def _maybe_reload(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.check_every:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                named = {"default": DEFAULT_TEMPLATE, **json.load(f)}
+            for src in named.values():
+                compile_template(src)  # نرفض الملف كامل لو فيه قالب خربان
+        except Exception:
+            log.exception("templates: keeping previous set, failed to load %s", self.path)
+            self._mtime = mtime
+            return
+        self.named = named
+        self._compiled.clear()
+        self._mtime = mtime
+        log.info("templates: loaded %d from %s", len(named), self.path)
+
+    def get(self, name_or_source: str, parse_mode: str | None = None):
+        self._maybe_reload()
+        key = (name_or_source, parse_mode)
+        fn = self._compiled.get(key)
+        if fn is None:
+            src = self.named.get(name_or_source, name_or_source)
+            fn = self._compiled[key] = compile_template(src, parse_mode, plain=src is DEFAULT_TEMPLATE)
+        return fn
+
+    def render(self, payload: dict, template: str | None = None, parse_mode: str | None = None) -> str:
+        if template is None:
+            strategy = payload.get("strategy")
+            template = f"strategy:{strategy}" if strategy and f"strategy:{strategy}" in self.named else "default"
+        return self.get(template, parse_mode)(payload)
+
+
+if __name__ == "__main__":
+    # micro-benchmark: python templates.py
+    import timeit
+
+    payload = {"symbol": "SPX", "side": "buy", "price": "5123.25", "timeframe": "15", "strategy": "orb"}
+    store = TemplateStore()
+    for mode in (None, "HTML", "MarkdownV2"):
+        fn = store.get("default", mode)
+        n, t = timeit.Timer(lambda: fn(payload)).autorange()
+        print(f"render parse_mode={mode!s:<10} {t / n * 1e6:7.2f} µs/alert")
+    n, t = timeit.Timer(lambda: store.render(payload)).autorange()
+    print(f"store.render (lookup+render)   {t / n * 1e6:7.2f} µs/alert")
+    n, t = timeit.Timer(lambda: compile_template(DEFAULT_TEMPLATE)).autorange()
+    print(f"compile (uncached)             {t / n * 1e6:7.2f} µs")
@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+SECRET = "s3cret"
+
+
+@pytest.fixture(scope="module")
+def bridge(tmp_path_factory):
+    work = tmp_path_factory.mktemp("bridge")
+    with pytest.MonkeyPatch.context() as mp:
+        for k, v in {"BOT_TOKEN": "1:test", "CHAT_ID": "-100", "ALERT_SECRET": SECRET, "STATE_URL": "memory",
+                     "JOURNAL_DIR": str(work / "journal"), "BATCH_GROUP": "3", "TG_GROUP_RATE": "1e9", "TG_GROUP_BURST": "1e9",
+                     "TG_GLOBAL_RATE": "1e9", "DRAIN_TIMEOUT": "2"}.items():
+            mp.setenv(k, v)
+        mod = importlib.import_module("app")
+    sent = []
+
+    async def send(text, parse_mode=None, chat_id=None):
+        sent.append(text)
+        return True, {}
+
+    mod.delivery._send = send
+    mod.sent = sent
+    loop = asyncio.new_event_loop()
+    life = mod.app.router.lifespan_context(mod.app)
+    loop.run_until_complete(life.__aenter__())
+    mod.run = loop.run_until_complete
+    yield mod
+    loop.run_until_complete(life.__aexit__(None, None, None))
+    loop.close()
+
+
+async def call(app, path, chunks, headers=(), query=b""):
+    """Drive the ASGI app the way uvicorn does: one http.request message per body chunk."""
+    msgs = [{"type": "http.request", "body": c, "more_body": True} for c in chunks]
+    msgs.append({"type": "http.request", "body": b"", "more_body": False})
+    out = {"body": b""}
+
+    async def receive():
+        if msgs:
+            await asyncio.sleep(0)  # chunks arrive over time, not all at once
+            return msgs.pop(0)
+        await asyncio.Event().wait()  # client stays connected
+
+    async def send(msg):
+        if msg["type"] == "http.response.start":
+            out["status"] = msg["status"]
+        elif msg["type"] == "http.response.body":
+            out["body"] += msg.get("body", b"")
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query,
+             "root_path": "", "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers]}
+    await asyncio.wait_for(app(scope, receive, send), 10)  # a lost body chunk shows up as a hang
+    return out["status"], out["body"]
+
+
+def alerts(tag, n):
+    return [json.dumps({"symbol": "SPX", "side": "buy", "price": i, "alert_id": f"{tag}-{i}"}).encode() + b"\n"
+            for i in range(n)]
+
+
+def test_batch_ndjson_reads_every_chunk(bridge):
+    status, body = bridge.run(call(bridge.app, "/webhook/batch", alerts("ndjson", 20),
+                                   [("X-Alert-Secret", SECRET), ("Accept", "application/x-ndjson")]))
+    results = [json.loads(ln) for ln in body.splitlines()]
+    assert status == 200
+    assert [r["i"] for r in results] == list(range(20))
+    assert all(r["status"] == 202 for r in results)
+
+
+def test_batch_json_reads_every_chunk(bridge):
+    status, body = bridge.run(call(bridge.app, "/webhook/batch", alerts("json", 20), [("X-Alert-Secret", SECRET)]))
+    out = json.loads(body)
+    assert status == 200 and out["count"] == out["accepted"] == 20
+
+
+def test_batch_secret_only_in_header(bridge):
+    status, _ = bridge.run(call(bridge.app, "/webhook/batch", alerts("q", 1), query=f"secret={SECRET}".encode()))
+    assert status == 400
+
+
+def test_failed_accept_does_not_mark_retry_duplicate(bridge, monkeypatch):
+    body = json.dumps({"secret": SECRET, "symbol": "NDX", "side": "sell", "price": 1, "alert_id": "retry-1"}).encode()
+
+    async def broken(payload):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(bridge.journal, "append", broken)
+        with pytest.raises(OSError):  # the server turns this into a 500
+            bridge.run(call(bridge.app, "/webhook", [body]))
+    status, out = bridge.run(call(bridge.app, "/webhook", [body]))
+    assert status == 202 and json.loads(out)["queued"]
+    status, out = bridge.run(call(bridge.app, "/webhook", [body]))
+    assert status == 200 and json.loads(out)["duplicate"]
+
+
+def test_bad_route_template_fails_up_front(bridge):
+    from routing import Destination
+
+    bridge._check_destinations([Destination("1", "{symbol|upper}", "HTML"), Destination("2")])
+    for d in (Destination("1", "{symbol|bogus}"), Destination("1", None, "markdownv2")):
+        with pytest.raises(ValueError, match="chat 1"):
+            bridge._check_destinations([d])
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+from batch import BodyTooLarge, ItemParser, iter_items
+
+ITEMS = [{"symbol": "SPX", "price": 5012.25, "text": 'a "quoted", [bracketed] {x}'},
+         {"symbol": "توصية", "n": 12345678}, [1, 2], "s", 7]
+
+
+def parse(body: bytes, size: int) -> list:
+    p, out = ItemParser(), []
+    for i in range(0, len(body), size):
+        out += p.feed(body[i:i + size])
+    return out + p.feed(b"", final=True)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 20])
+def test_split_chunks(size):
+    array = json.dumps(ITEMS, ensure_ascii=False).encode()
+    ndjson = "\n".join(json.dumps(x, ensure_ascii=False) for x in ITEMS).encode()
+    assert parse(array, size) == ITEMS
+    assert parse(ndjson, size) == ITEMS
+
+
+@pytest.mark.parametrize("size", [1, 5, 1 << 20])
+def test_malformed_item_mid_array(size):
+    body = b'[{"a": 1}, {"b": oops, "c": [1, "]"]}, {"d": 2}, nul, {"e": "x,y"}]'
+    out = parse(body, size)
+    assert len(out) == 5
+    assert out[0] == {"a": 1}
+    assert isinstance(out[1], ValueError)
+    assert out[2] == {"d": 2}
+    assert isinstance(out[3], ValueError)
+    assert out[4] == {"e": "x,y"}
+
+
+def test_stray_closer_does_not_stall():
+    out = parse(b'[}, {"a": 1}}, {"b": 2}]', 3)
+    assert isinstance(out[0], ValueError) and out[-1] == {"b": 2}
+
+
+@pytest.mark.parametrize("size", [1, 1 << 20])
+def test_malformed_ndjson_line(size):
+    out = parse(b'{"a": 1}\n{oops\n\n{"b": 2}', size)
+    assert out[0] == {"a": 1} and isinstance(out[1], ValueError) and out[2] == {"b": 2}
+
+
+def test_truncated_body():
+    out = parse(b'[{"a": 1}, {"b": "unfinished', 4)
+    assert out[0] == {"a": 1}
+    assert [str(e) for e in out[1:]] == ["invalid JSON: truncated item"]
+    out = parse(b'[{"a": 1}', 4)
+    assert out[0] == {"a": 1} and str(out[1]) == "unterminated JSON array"
+
+
+def test_nothing_after_closing_bracket():
+    p = ItemParser()
+    assert p.feed(b'[{"a": 1}] [{"b": 2}]') == [{"a": 1}]
+    assert p.finished and p.feed(b"more") == []
+
+
+def test_iter_items_limit():
+    async def stream(chunks):
+        for c in chunks:
+            yield c
+
+    async def run(chunks, limit):
+        return [x async for items in iter_items(stream(chunks), limit) for x in items]
+
+    assert asyncio.run(run([b'{"a":1}\n{"b"', b':2}\n'], 100)) == [{"a": 1}, {"b": 2}]
+    with pytest.raises(BodyTooLarge):
+        asyncio.run(run([b'{"a":1}\n', b'{"b":2}\n'], 10))
@@ -0,0 +1,58 @@
+import asyncio
+
+from coalesce import Coalescer, tg_len
+from delivery import Job
+from templates import DISCLAIMER, ESCAPERS, TemplateStore
+
+
+def _collect(jobs, **kw):
+    out = []
+
+    async def run():
+        c = Coalescer(out.append, 0.01, disclaimer=DISCLAIMER, escapers=ESCAPERS, **kw)
+        for j in jobs:
+            c.add(j)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    return out
+
+
+def test_tg_len_counts_utf16_units():
+    assert tg_len("abc") == 3
+    assert tg_len("📊") == 2
+
+
+def test_merges_and_keeps_one_disclaimer():
+    jobs = [Job("-1", f"alert {i}\n{DISCLAIMER}", ids=(i,)) for i in range(3)]
+    out = _collect(jobs)
+    assert len(out) == 1
+    assert out[0].text.count(DISCLAIMER) == 1
+    assert out[0].text.endswith(DISCLAIMER)
+    assert out[0].ids == (0, 1, 2)
+
+
+def test_never_exceeds_limit_in_utf16_units():
+    store = TemplateStore()
+    payload = {"symbol": "SPX", "side": "call", "price": "5200.25", "timeframe": "5"}
+    text = store.render(payload)
+    jobs = [Job("-1", text, ids=(i,)) for i in range(200)]
+    out = _collect(jobs)
+    assert len(out) > 1
+    assert all(tg_len(j.text) <= 4096 for j in out)
+    assert sum(len(j.ids) for j in out) == 200
+
+
+def test_markdownv2_disclaimer_is_deduplicated():
+    store = TemplateStore()
+    payload = {"symbol": "SPX", "side": "call", "price": "1.5", "timeframe": "5"}
+    text = store.render(payload, None, "MarkdownV2")
+    escaped = ESCAPERS["MarkdownV2"](DISCLAIMER)
+    out = _collect([Job("-1", text, "MarkdownV2", ids=(i,)) for i in range(3)])
+    assert len(out) == 1
+    assert out[0].text.count(escaped) == 1
+
+
+def test_batches_are_per_chat_and_parse_mode():
+    out = _collect([Job("-1", "a"), Job("-2", "b"), Job("-1", "c", "HTML")])
+    assert {(j.chat_id, j.parse_mode) for j in out} == {("-1", None), ("-1", "HTML"), ("-2", None)}
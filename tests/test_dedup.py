@@ -0,0 +1,47 @@
+from dedup import DedupCache, fingerprint
+
+
+def test_alert_id_wins_over_fields():
+    a = fingerprint({"alert_id": "x1", "symbol": "SPX"})
+    b = fingerprint({"alert_id": "x1", "symbol": "QQQ"})
+    assert a == b
+
+
+def test_price_bucket_groups_nearby_prices():
+    a = fingerprint({"symbol": "SPX", "side": "buy", "price": "5001.2"}, price_bucket=1)
+    b = fingerprint({"symbol": "SPX", "side": "buy", "price": "5001.9"}, price_bucket=1)
+    c = fingerprint({"symbol": "SPX", "side": "buy", "price": "5002.1"}, price_bucket=1)
+    assert a == b != c
+
+
+def test_secret_does_not_change_fallback_key():
+    assert fingerprint({"foo": 1, "secret": "a"}) == fingerprint({"foo": 1, "secret": "b"})
+
+
+def test_cache_hits_misses_and_capacity():
+    c = DedupCache(ttl=60, max_keys=2)
+    assert not c.seen(b"a")
+    assert c.seen(b"a")
+    assert not c.seen(b"b")
+    assert not c.seen(b"c")  # evicts "a"
+    assert not c.seen(b"a")
+    assert c.stats() == {"hits": 1, "misses": 4, "size": 2}
+
+
+def test_cache_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("dedup.time.time", lambda: now[0])
+    c = DedupCache(ttl=10)
+    c.seen(b"k")
+    now[0] += 11
+    assert not c.seen(b"k")
+
+
+def test_save_and_load(tmp_path):
+    c = DedupCache(ttl=60)
+    c.seen(b"k")
+    path = str(tmp_path / "dedup.json")
+    c.save(path)
+    d = DedupCache(ttl=60)
+    d.load(path)
+    assert d.seen(b"k")
@@ -0,0 +1,66 @@
+import asyncio
+
+from delivery import Delivery, Job, RateLimiter
+from state import MemoryState
+
+
+async def _ok(text, parse_mode=None, chat_id=None):
+    return True, {}
+
+
+def make(send=_ok, **kw):
+    done = []
+    d = Delivery(send, RateLimiter(MemoryState(), global_rate=1e6, private_rate=1e6),
+                 on_done=done.append, backoff=0.001, **kw)
+    return d, done
+
+
+def test_shed_oldest_keeps_queue_bounded():
+    async def run():
+        d, done = make(max_depth=3, policy="shed_oldest")
+        assert d.room() == float("inf")
+        for n in range(10):
+            assert d.submit(Job("1", str(n)))
+        assert d.depth() == 3
+        assert d.stats["shed"] == 7
+        assert [j.text for j in done] == [str(n) for n in range(7)]
+    asyncio.run(run())
+
+
+def test_reject_when_full():
+    async def run():
+        d, done = make(max_depth=2)
+        assert d.submit(Job("1", "a")) and d.submit(Job("1", "b"))
+        assert d.room() == 0
+        assert not d.submit(Job("1", "c"))
+        assert d.stats["rejected"] == 1 and not done
+        assert d.submit(Job("1", "c"), force=True)  # journal replay only
+        assert d.depth() == 3
+    asyncio.run(run())
+
+
+def test_limiter_error_is_retried_not_dropped():
+    class Flaky(MemoryState):
+        fails = 3
+
+        async def reserve(self, buckets):
+            if self.fails:
+                self.fails -= 1
+                raise OSError("database is locked")
+            return await super().reserve(buckets)
+
+    async def run():
+        sent, done = [], []
+
+        async def send(text, parse_mode=None, chat_id=None):
+            sent.append(text)
+            return True, {}
+
+        d = Delivery(send, RateLimiter(Flaky(), global_rate=1e6, private_rate=1e6),
+                     on_done=done.append, backoff=0.001)
+        d.start()
+        d.submit(Job("1", "hi"))
+        await d.stop(timeout=2.0)
+        assert sent == ["hi"] and len(done) == 1
+        assert d.stats["delivered"] == 1 and d.stats["failed"] == 0
+    asyncio.run(run())
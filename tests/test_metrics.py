@@ -0,0 +1,71 @@
+from metrics import Registry
+
+
+def _lines(reg):
+    text = reg.render()
+    assert text.endswith("\n")
+    return text.splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    h = reg.histogram("lat_seconds", "Latency.", "stage", bounds=(0.1, 1.0))
+    child = h.labels("parse")
+    for v in (0.05, 0.1, 0.5, 2.0, 7.0):
+        child.observe(v)
+    assert _lines(reg) == [
+        "# HELP lat_seconds Latency.",
+        "# TYPE lat_seconds histogram",
+        'lat_seconds_bucket{stage="parse",le="0.1"} 2',
+        'lat_seconds_bucket{stage="parse",le="1.0"} 3',
+        'lat_seconds_bucket{stage="parse",le="+Inf"} 5',
+        'lat_seconds_sum{stage="parse"} 9.65',
+        'lat_seconds_count{stage="parse"} 5',
+    ]
+
+
+def test_unlabelled_families():
+    reg = Registry()
+    reg.histogram("ra_seconds", "Retry after.", bounds=(1, 5)).labels(None).observe(3)
+    reg.gauge("inflight", "In flight.").labels(None).inc(2)
+    assert _lines(reg)[2:] == [
+        'ra_seconds_bucket{le="1"} 0',
+        'ra_seconds_bucket{le="5"} 1',
+        'ra_seconds_bucket{le="+Inf"} 1',
+        "ra_seconds_sum 3.0",
+        "ra_seconds_count 1",
+        "# HELP inflight In flight.",
+        "# TYPE inflight gauge",
+        "inflight 2",
+    ]
+
+
+def test_label_values_are_escaped():
+    reg = Registry()
+    c = reg.counter("errs_total", "Errors.", "error")
+    c.labels('bad "quote" \\ and\nnewline').inc()
+    c.labels(429).inc(3)
+    assert _lines(reg)[2:] == [
+        'errs_total{error="bad \\"quote\\" \\\\ and\\nnewline"} 1',
+        'errs_total{error="429"} 3',
+    ]
+
+
+def test_gauge_fn_values():
+    def boom():
+        raise RuntimeError("scrape-time failure")
+
+    reg = Registry()
+    reg.gauge_fn("off", "Disabled.", lambda: None)
+    reg.gauge_fn("broken", "Raises.", boom)
+    reg.gauge_fn("depth", "Queue depth.", lambda: 4)
+    reg.gauge_fn("dedup", "Dedup stats.", lambda: {"hits": 2, ("shard", "a\"b"): 0.5}, kind="counter")
+    assert _lines(reg) == [
+        "# HELP depth Queue depth.",
+        "# TYPE depth gauge",
+        "depth 4",
+        "# HELP dedup Dedup stats.",
+        "# TYPE dedup counter",
+        'dedup{key="hits"} 2',
+        'dedup{shard="a\\"b"} 0.5',
+    ]
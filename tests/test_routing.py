@@ -0,0 +1,55 @@
+import pytest
+
+from routing import Destination, Router
+
+ROUTES = [
+    {"symbol": "*", "strategy": "swing", "chats": ["swing"]},
+    {"symbol": "SPX", "chats": ["exact"]},
+    {"symbol": "SPX*", "chats": ["prefix", "exact"]},
+    {"symbol": "S?X", "chats": ["glob"]},
+    {"symbol": ["BTC*", "ETH*"], "side": ["buy"], "timeframe": "1h",
+     "chats": [{"chat_id": "crypto", "template": "{symbol}", "parse_mode": "HTML"}]},
+]
+DEFAULT = {"chats": ["fallback"], "parse_mode": "MarkdownV2"}
+
+
+def chats(router, **payload):
+    return [d.chat_id for d in router.match(payload)]
+
+
+def test_config_order_across_indexes():
+    r = Router(ROUTES, DEFAULT)
+    # exact, trie and glob hits come back in rule order, de-duplicated by chat
+    assert chats(r, symbol="spx") == ["exact", "prefix", "glob"]
+    assert chats(r, symbol="SPX", strategy="swing") == ["swing", "exact", "prefix", "glob"]
+
+
+def test_prefix_and_glob():
+    r = Router(ROUTES, DEFAULT)
+    assert chats(r, symbol="SPXW") == ["prefix", "exact"]
+    assert chats(r, symbol="SAX") == ["glob"]
+    assert chats(r, symbol="SAXX") == ["fallback"]
+
+
+def test_filters_and_destination_options():
+    r = Router(ROUTES, DEFAULT)
+    assert r.match({"symbol": "ETHUSDT", "side": "BUY ", "timeframe": "1H"}) == [
+        Destination("crypto", "{symbol}", "HTML")]
+    assert chats(r, symbol="ETHUSDT", side="sell", timeframe="1H") == ["fallback"]
+    assert chats(r, symbol="BTC", side="buy", timeframe="4H") == ["fallback"]
+
+
+def test_default_and_no_default():
+    assert Router(ROUTES, DEFAULT).match({}) == [Destination("fallback", None, "MarkdownV2")]
+    assert Router(ROUTES).match({"symbol": "NDX"}) == []
+
+
+def test_route_without_chats():
+    with pytest.raises(ValueError):
+        Router([{"symbol": "SPX"}])
+
+
+def test_destinations_collected():
+    r = Router(ROUTES, DEFAULT)
+    assert {d.chat_id for d in r.destinations} == {"swing", "exact", "prefix", "glob", "crypto", "fallback"}
+    assert Destination("crypto", "{symbol}", "HTML") in r.destinations
@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from state import MemoryState, SQLiteState, State, _take, open_state
+
+
+def test_take_bucket_math():
+    # full bucket: take one, no wait
+    assert _take(3.0, 0.0, 0.0, 1.0, 3.0, 0.0) == (2.0, 0.0)
+    # empty bucket at 2 tokens/s: owe half a token -> 0.25 s
+    assert _take(0.0, 10.0, 0.0, 2.0, 3.0, 10.0) == (-1.0, 0.5)
+    assert _take(0.5, 10.0, 0.0, 2.0, 3.0, 10.0) == (-0.5, 0.25)
+    # refill is capped at burst
+    assert _take(0.0, 0.0, 0.0, 1.0, 3.0, 100.0) == (2.0, 0.0)
+    # clock going backwards never refills
+    assert _take(1.0, 10.0, 0.0, 1.0, 3.0, 5.0) == (0.0, 0.0)
+    # a retry_after block wins over the bucket
+    assert _take(3.0, 0.0, 7.0, 1.0, 3.0, 2.0) == (2.0, 5.0)
+
+
+def test_state_is_abstract():
+    with pytest.raises(TypeError):
+        State()
+
+    class Partial(State):
+        async def reserve(self, buckets):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    s = open_state("memory") if request.param == "memory" else open_state(f"sqlite:///{tmp_path}/s.db")
+    yield s
+    asyncio.run(s.close())
+
+
+def test_reserve_and_block(backend):
+    async def run():
+        bucket = [("k", 1.0, 2.0)]
+        assert await backend.reserve(bucket) == 0.0
+        assert await backend.reserve(bucket) == 0.0
+        assert 0.9 < await backend.reserve(bucket) <= 1.0
+        await backend.block("other", 30)
+        assert 29 < await backend.reserve([("other", 1.0, 2.0)]) <= 30
+    asyncio.run(run())
+
+
+def test_seen_many_and_forget(backend):
+    async def run():
+        assert await backend.seen_many([b"a", b"b", b"a"], 60) == [False, False, True]
+        assert await backend.seen(b"b", 60)
+        await backend.forget(b"b")
+        assert not await backend.seen(b"b", 60)
+        assert backend.dedup_stats()["hits"] == 2
+    asyncio.run(run())
+
+
+def test_sqlite_shared_between_connections(tmp_path):
+    async def run():
+        a, b = SQLiteState(str(tmp_path / "s.db")), SQLiteState(str(tmp_path / "s.db"))
+        assert await a.seen_many([b"x"], 60) == [False]
+        assert await b.seen_many([b"x"], 60) == [True]
+        await a.close()
+        await b.close()
+    asyncio.run(run())
+
+
+def test_sqlite_busy_raises_without_blocking_loop(tmp_path):
+    path = str(tmp_path / "s.db")
+    holder = sqlite3.connect(path, isolation_level=None)
+
+    async def run():
+        s = SQLiteState(path, timeout=0.3)
+        holder.execute("BEGIN IMMEDIATE")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        t = asyncio.create_task(tick())
+        with pytest.raises(sqlite3.OperationalError):
+            await s.reserve([("k", 1.0, 1.0)])
+        t.cancel()
+        holder.execute("ROLLBACK")
+        assert ticks >= 10  # the loop kept running while sqlite waited
+        assert await s.reserve([("k", 1.0, 1.0)]) == 0.0
+        await s.close()
+    asyncio.run(run())
+    holder.close()
+
+
+def test_sqlite_purge_caps_size(tmp_path):
+    async def run():
+        s = SQLiteState(str(tmp_path / "s.db"), max_keys=5, purge_every=10)
+        await s.seen_many([bytes([i]) for i in range(12)], 60)
+        assert s.dedup_stats()["size"] == 5
+        await s.close()
+    asyncio.run(run())
+
+
+def test_open_state_urls(tmp_path):
+    assert isinstance(open_state(""), MemoryState)
+    s = open_state(f"sqlite:///{tmp_path}/x/s.db")
+    assert isinstance(s, SQLiteState) and (tmp_path / "x" / "s.db").exists()
+    asyncio.run(s.close())
+    with pytest.raises(ValueError):
+        open_state("postgres://x")
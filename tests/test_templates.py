@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from templates import (
+    DEFAULT_TEMPLATE, DISCLAIMER, ESCAPERS, TemplateStore, arabic_interval, compile_template, normalize_side,
+)
+
+NASTY = "a_b*c[d]<e>&f.g!"
+
+
+def test_field_escaping_per_parse_mode():
+    expected = {
+        None: NASTY,
+        "HTML": "a_b*c[d]&lt;e&gt;&amp;f.g!",
+        "Markdown": "a\\_b\\*c\\[d]<e>&f.g!",
+        "MarkdownV2": "a\\_b\\*c\\[d\\]<e\\>&f\\.g\\!",
+    }
+    assert set(expected) == set(ESCAPERS)
+    for mode, out in expected.items():
+        assert compile_template("<b>{symbol}</b>", mode)({"symbol": NASTY}) == f"<b>{out}</b>"
+
+
+def test_plain_only_for_default_template():
+    store = TemplateStore()
+    payload = {"symbol": "SPX", "side": "buy", "price": "5200.5", "timeframe": "5"}
+    text = store.render(payload, parse_mode="MarkdownV2")
+    # the built-in default is plain text, so its literals are escaped too
+    assert text.endswith(ESCAPERS["MarkdownV2"](DISCLAIMER))
+    assert "5200\\.5" in text
+    assert store.get("default", "MarkdownV2") is store.get("default", "MarkdownV2")
+    # a custom template is markup: its own text is left alone
+    assert store.render(payload, "*{symbol}* done.", "MarkdownV2") == "*SPX* done."
+    assert compile_template(DEFAULT_TEMPLATE, "HTML")(payload) == store.render(payload, parse_mode="HTML")
+
+
+def test_normalize_side_matches_baseline():
+    for raw in ("put", "Sell", " SHORT "):
+        assert normalize_side(raw) == "PUT 🔴"
+    for raw in ("call", "BUY", "long"):
+        assert normalize_side(raw) == "Call 🟢"
+    assert normalize_side(" flat ") == "flat"
+
+
+def test_arabic_interval_forms():
+    assert arabic_interval("1") == "1 دقيقة"
+    assert arabic_interval("2") == "دقيقتان"
+    assert arabic_interval("5") == "5 دقائق"
+    assert arabic_interval("15") == "15 دقيقة"
+    assert arabic_interval("5m") == "5 دقائق"
+    assert arabic_interval("2H") == "ساعتان"
+    assert arabic_interval("4h") == "4 ساعات"
+    assert arabic_interval("D") == "1 يوم"
+    assert arabic_interval("3W") == "3 أسابيع"
+    assert arabic_interval("5M") == "5 أشهر"
+    assert arabic_interval("") == "-"
+    assert arabic_interval("weird") == "weird"
+
+
+def test_filters_and_braces():
+    render = compile_template("{{{symbol|lower}}} {side|side|upper} {missing}")
+    assert render({"symbol": "SPX", "side": "buy"}) == "{spx} CALL 🟢 ?"
+
+
+@pytest.mark.parametrize("source", ["{symbol|bogus}", "{symbol|upper|nope}"])
+def test_unknown_filter_rejected(source):
+    with pytest.raises(ValueError, match="unknown template filter"):
+        compile_template(source)
+
+
+def test_unknown_parse_mode_rejected():
+    with pytest.raises(ValueError, match="parse_mode"):
+        compile_template("{symbol}", "markdownv2")
+
+
+def test_hot_reload_keeps_previous_set_when_broken(tmp_path):
+    path = tmp_path / "t.json"
+
+    def write(content, tick):
+        path.write_text(content, encoding="utf-8")
+        os.utime(path, ns=(tick * 10**9, tick * 10**9))
+
+    write(json.dumps({"default": "A {symbol}", "strategy:swing": "S {symbol}"}), 1)
+    store = TemplateStore(str(path), check_every=0)
+    assert store.render({"symbol": "X"}) == "A X"
+    assert store.render({"symbol": "X", "strategy": "swing"}) == "S X"
+    assert store.render({"symbol": "X", "strategy": "other"}) == "A X"
+
+    write(json.dumps({"default": "B {symbol}"}), 2)
+    assert store.render({"symbol": "X"}) == "B X"
+
+    for i, broken in enumerate(["{not json", json.dumps({"default": "{symbol|bogus}"})]):
+        write(broken, 3 + i)
+        assert store.render({"symbol": "X"}) == "B X"
+
+    os.unlink(path)
+    assert store.render({"symbol": "X"}) == "B X"